@@ -1,35 +1,49 @@
-from emoji import demojize, emojize
-from falcon import HTTPNotFound
+from functools import lru_cache
+
+from falcon import HTTP_NOT_MODIFIED, HTTPNotFound
 from falcon.hooks import before
 from falcon.constants import MEDIA_JSON
-from django.db.models import Count, Prefetch, Q, Max
+from django.db.models import Prefetch, Q, Max
 
-from app.forms import get_content, get_emoji, get_metadata, get_name, get_location
-from app.hooks import auth_required, auth_user
-from app.models import Bond, Chat, Post, Push, Save, User
+from app.directory import deleted, forget_directory, posted
+from app.emojis import demojize, emojize
+from app.forms import get_content, get_emoji, get_name, get_location
+from app.hooks import auth_required, auth_user, forget_user
+from app.models import Bond, Chat, Feed, Post, Push, Save, User
 from app.push import send_push
+from app.search import search_people, search_posts
 from app.serializers import build_entry, build_user, build_chat
+from app.stream import events, publish
+from app.threads import load_thread
+from app.tokens import Tokens
 from app.utils import build_hash, utc_timestamp
 from app.validation import (authentication, registration, valid_content, valid_reply,
                             valid_thread, profiling, valid_handle, valid_phone)
 from project.settings import FERNET, VAPID_PUBLIC_KEY
+from project.vars import LOCATIONS
 
-Posts = Post.objects.annotate(
-    replies=Count('descendants')
-).select_related('created_by')
+Posts = Post.objects.select_related('created_by')
+KIDS = 5
 
 PPFR = Prefetch('parent', Posts)
-PFR = Prefetch('kids', Posts.order_by('-id'))
-RPFR = Prefetch('kids', Posts.prefetch_related(PFR))
+# newest kids of each entry, sliced prefetch runs as a window function
+PFR = Prefetch('kids', Posts.order_by('-id')[:KIDS], to_attr='children')
 
-def paginate(req, qs, limit=16):
+def paginate(req, qs, limit=16, keyset=False):
+    """Slice a page of qs, keyset lists must be ordered by newest id."""
     p = req.params.get('p', '1').strip()
+    before = req.params.get('before', '').strip()
     if p.isdecimal() and int(p) > 1:
         number = int(p)
     else:
         number = 1
-    index = (number - 1) * limit
-    return qs[index:index + limit], number
+    if keyset and before.isdecimal():
+        entries = qs.filter(id__lt=int(before))[:limit]
+    else:
+        index = (number - 1) * limit
+        entries = qs[index:index + limit]
+    cursor = entries[limit - 1].id if keyset and len(entries) == limit else None
+    return entries, number, cursor
 
 
 class LoginEndpoint:
@@ -79,6 +93,9 @@ class RegisterEndpoint:
                 birthday=f['birthday'],
                 location=f['location'],
             )
+            user.set_search()
+            user.save(update_fields=['search'])
+            forget_directory()
             # create self bond
             Bond.objects.create(
                 created_by=user,
@@ -114,10 +131,15 @@ class ProfileEndpoint:
         if errors:
             resp.media = {'errors': errors}
         else:
-            for field, value in f.items():
-                if getattr(req.user, field, '') != value:
-                    setattr(req.user, field, value)
-            req.user.save()
+            # req.user is a cached snapshot, diff and rebuild search on the fresh row
+            req.user = User.objects.get(id=req.user.id)
+            changed = [field for field, value in f.items() if getattr(req.user, field, '') != value]
+            for field in changed:
+                setattr(req.user, field, f[field])
+            req.user.set_search()
+            req.user.save(update_fields=changed + ['search'])
+            forget_user(req.user)
+            forget_directory()
             resp.media = {'user': build_user(req.user)}
 
 
@@ -150,6 +172,7 @@ class DetailsEndpoint:
             req.user.phone = p
             req.user.social = s
             req.user.save(update_fields=['phone', 'social'])
+            forget_user(req.user)
             resp.media = {'user': build_user(req.user)}
 
 
@@ -160,25 +183,27 @@ class ThreadEndpoint:
         resp.content_type = MEDIA_JSON
         form = req.get_media()
         content = get_content(form)
-        hashtags, links, mentions = get_metadata(content)
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
             errors['content'] = valid_thread(content)
         errors = {k: v for k, v in errors.items() if v}
         if errors:
             resp.media = {'errors': errors}
         else:
-            th = Post.objects.create(
+            th = Post(
                 created_by=req.user,
                 content=content,
                 created_at=utc_timestamp(),
-                link=links[0] if links else '',
-                hashtag=hashtags[0] if hashtags else '',
-                at_user=User.objects.filter(
-                    username=mentions[0]
-                ).first() if mentions else None,
+                link=tokens.link,
+                hashtag=tokens.hashtag,
+                at_user=tokens.at_user,
             )
+            th.set_html(tokens)
+            th.save()
+            posted(req.user)
+            th.fan_out()
             if th.at_user and th.at_user != req.user:
                 send_push(
                     th.at_user,
@@ -206,7 +231,7 @@ class SendEndpoint:
         errors = {}
         if forward and not backward:
             errors['request'] = "Wait for the recipient to respond"
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(Tokens(content), req.user)
         errors = {k: v for k, v in errors.items() if v}
         if errors:
             resp.media = {'errors': errors}
@@ -231,43 +256,36 @@ class SendEndpoint:
 
 class FeedEndpoint:
     def fetch_entries(self, user):
-        friends = Bond.objects.filter(created_by=user).values('to_user_id')
-        entries = Posts.filter(created_by__in=friends).order_by('-id')
+        entries = Posts.filter(feeds__user=user).order_by('-id')
         return entries.prefetch_related(PFR, PPFR)
 
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
         resp.content_type = MEDIA_JSON
-        entries, page = paginate(req, self.fetch_entries(req.user))
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, req.user.saves, has_parent=True, has_kids=True) for entry in entries]
         }
 
 
 class ReplyEndpoint:
-    def fetch_entries(self, parent):
-        return Posts.filter(parent=parent).order_by('-id').prefetch_related(RPFR)
-
-    def fetch_ancestors(self, parent):
-        return Posts.filter(
-            id__in=parent.ancestors.values('id')
-        ).order_by('id').prefetch_related(PPFR)
-
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp, id):
-        parent = Posts.filter(id=id).first()
-        if not parent:
+        before = req.params.get('before', '').strip()
+        thread = load_thread(Posts, id, int(before) if before.isdecimal() else None)
+        if not thread:
             raise HTTPNotFound
-        ancestors = self.fetch_ancestors(parent)
-        entries = self.fetch_entries(parent)
+        parent, ancestors, entries, cursor, _ = thread
         resp.content_type = MEDIA_JSON
         resp.media = {
             "entry": build_entry(parent, req.user.saves),
             "ancestors": [build_entry(entry, req.user.saves) for entry in ancestors],
-            "kids": [build_entry(entry, req.user.saves, has_kids=True) for entry in entries]
+            "kids": [build_entry(entry, req.user.saves, has_kids=True) for entry in entries],
+            "next_cursor": cursor
         }
 
     @before(auth_user)
@@ -279,11 +297,11 @@ class ReplyEndpoint:
             raise HTTPNotFound
         form = req.get_media()
         content = get_content(form)
-        hashtags, links, mentions = get_metadata(content)
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
-            errors['content'] = valid_reply(parent, req.user, content, mentions)
+            errors['content'] = valid_reply(parent, req.user, content, tokens.mentions)
         errors = {k: v for k, v in errors.items() if v}
         if errors:
             resp.media = {'errors': errors}
@@ -291,19 +309,21 @@ class ReplyEndpoint:
             if existing := Posts.filter(parent=parent, created_by=req.user).first():
                 resp.media = build_entry(existing, [], has_parent=True)
                 return
-            re = Post.objects.create(
+            re = Post(
                 parent=parent,
                 created_by=req.user,
                 to_user=parent.created_by,
                 content=content,
                 created_at=utc_timestamp(),
-                link=links[0] if links else '',
-                hashtag=hashtags[0] if hashtags else '',
-                at_user=User.objects.filter(
-                    username=mentions[0]
-                ).first() if mentions else None,
+                link=tokens.link,
+                hashtag=tokens.hashtag,
+                at_user=tokens.at_user,
             )
+            re.set_html(tokens)
+            re.save()
+            posted(req.user)
             re.set_ancestors()
+            re.fan_out()
             if parent.created_by != req.user:
                 send_push(
                     parent.created_by,
@@ -335,10 +355,11 @@ class MemberEndpoint:
         member = User.objects.filter(username=username).first()
         if not member:
             raise HTTPNotFound
-        entries, page = paginate(req, self.fetch_entries(member))
+        entries, page, cursor = paginate(req, self.fetch_entries(member), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "member": build_user(member),
             "entries": [build_entry(entry, req.user.saves, has_parent=True, has_kids=True) for entry in entries]
         }
@@ -352,10 +373,11 @@ class FollowingEndpoint:
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req.user), 24)
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), 24, keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_user(entry.to_user) for entry in entries]
         }
 
@@ -366,17 +388,20 @@ class FollowersEndpoint:
         return entries.order_by('-id').select_related('created_by')
 
     def clear_followers(self, user):
-        Bond.objects.filter(
+        cleared = Bond.objects.filter(
             to_user=user, seen_at=.0
         ).update(seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req.user), 24)
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), 24, keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_user(entry.created_by) for entry in entries]
         }
         if req.user.notif_followers:
@@ -389,17 +414,20 @@ class MentionsEndpoint:
         return entries.prefetch_related(PFR, PPFR)
 
     def clear_mentions(self, user):
-        Post.objects.filter(
+        cleared = Post.objects.filter(
             at_user=user, mention_seen_at=.0
         ).update(mention_seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req.user))
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, req.user.saves, has_parent=True, has_kids=True) for entry in entries]
         }
         if req.user.notif_mentions:
@@ -412,17 +440,20 @@ class RepliesEndpoint:
         return entries.prefetch_related(PPFR)
 
     def clear_replies(self, user):
-        Post.objects.filter(
+        cleared = Post.objects.filter(
             to_user=user, reply_seen_at=.0
         ).update(reply_seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req.user))
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, req.user.saves, has_parent=True) for entry in entries]
         }
         if req.user.notif_replies:
@@ -438,71 +469,67 @@ class SavedEndpoint:
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req.user))
+        entries, page, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, req.user.saves, has_parent=True, has_kids=True) for entry in entries]
         }
 
 
 class PeopleEndpoint:
-    fields = [
-        "username", "first_name", "last_name", "email",
-        "description", "birthday", "location", "emoji", "link"
-    ]
-
-    def build_query(self, terms):
-        query = Q()
-        for term in terms:
-            subquery = Q()
-            for field in self.fields:
-                icontains = {f'{field}__icontains': term}
-                subquery |= Q(**icontains)
-            query &= subquery
-        return query
-
     def fetch_entries(self, terms):
-        q = self.build_query(terms)
-        qs = User.objects.filter(q)
-        return qs.order_by('-seen_at')
+        return search_people(User.objects.all(), terms)
 
     @before(auth_user)
     def on_get(self, req, resp):
         q = demojize(req.params.get('q', '').strip())
         terms = [t.strip() for t in q.split() if t.strip()]
-        entries, page = paginate(req, self.fetch_entries(terms), 24)
+        entries, page, cursor = paginate(req, self.fetch_entries(terms), 24)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_user(entry) for entry in entries]
         }
 
 
-class DiscoverEndpoint:
-    def build_query(self, terms):
-        query = Q()
-        for term in terms:
-            query &= Q(content__icontains=term)
-        return query
+@lru_cache(maxsize=4096)
+def complete_location(prefix):
+    """Short prefixes match thousands of names, their top ones are kept."""
+    return LOCATIONS.complete(prefix)
+
+
+class LocationsEndpoint:
+    def on_get(self, req, resp):
+        prefix = req.params.get('prefix', '').strip()[:60]
+        resp.content_type = MEDIA_JSON
+        resp.cache_control = ['public', 'max-age=86400']
+        # ascii only, like the table, so the cache shares case variants
+        prefix = prefix.encode().lower().decode()
+        resp.media = {"locations": complete_location(prefix) if prefix else []}
+
 
+class DiscoverEndpoint:
     def fetch_entries(self, terms):
         if terms:
-            f = self.build_query(terms)
+            entries = search_posts(Posts, terms)
         else:
             last_ids = User.objects.annotate(last_id=Max('posts')).values('last_id')
-            f = Q(id__in=last_ids)
-        return Posts.filter(f).order_by('-id').prefetch_related(PFR, PPFR)
+            entries = Posts.filter(id__in=last_ids).order_by('-id')
+        return entries.prefetch_related(PFR, PPFR)
 
     @before(auth_user)
     def on_get(self, req, resp):
         q = demojize(req.params.get('q', '').strip())
         terms = [t.strip() for t in q.split() if t.strip()]
-        entries, page = paginate(req, self.fetch_entries(terms))
+        entries, page, cursor = paginate(req, self.fetch_entries(terms), keyset=not terms)
         saves = req.user.saves if req.user else []
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, saves, has_parent=True, has_kids=True) for entry in entries]
         }
 
@@ -511,17 +538,18 @@ class TrendingEndpoint:
     limit = 24
 
     def fetch_entries(self):
-        sample = Post.objects.filter(parent=None).exclude(kids=None).order_by('-id').values('id')[:self.limit]
-        entries = Posts.filter(id__in=sample).order_by('-replies', '-id')
+        sample = Post.objects.filter(parent=None, kid_count__gt=0).order_by('-id').values('id')[:self.limit]
+        entries = Posts.filter(id__in=sample).order_by('-descendant_count', '-id')
         return entries.prefetch_related(PFR)
 
     @before(auth_user)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries())
+        entries, page, cursor = paginate(req, self.fetch_entries())
         saves = req.user.saves if req.user else []
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_entry(entry, saves, has_kids=True) for entry in entries]
         }
 
@@ -537,10 +565,11 @@ class MessagesEndpoint:
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        entries, page = paginate(req, self.fetch_entries(req))
+        entries, page, cursor = paginate(req, self.fetch_entries(req), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_chat(entry) for entry in entries]
         }
 
@@ -553,9 +582,11 @@ class MessageEndpoint:
         return entries.select_related('created_by', 'to_user')
 
     def clear_messages(self, req, member):
-        Chat.objects.filter(
+        cleared = Chat.objects.filter(
             created_by=member, to_user=req.user, seen_at=.0
         ).update(seen_at=utc_timestamp())
+        if cleared:
+            publish(req.user.id)
 
     @before(auth_user)
     @before(auth_required)
@@ -564,10 +595,11 @@ class MessageEndpoint:
         member = User.objects.filter(username=username).first()
         if not member:
             raise HTTPNotFound
-        entries, page = paginate(req, self.fetch_entries(req, member))
+        entries, page, cursor = paginate(req, self.fetch_entries(req, member), keyset=True)
         resp.content_type = MEDIA_JSON
         resp.media = {
             "page": page,
+            "next_cursor": cursor,
             "entries": [build_chat(entry) for entry in entries]
         }
         self.clear_messages(req, member)
@@ -617,13 +649,30 @@ class NotificationsEndpoint:
     @before(auth_user)
     @before(auth_required)
     def on_get(self, req, resp):
-        resp.content_type = MEDIA_JSON
-        resp.media = {
+        counts = {
             'followers': req.user.notif_followers,
             'mentions': req.user.notif_mentions,
             'replies': req.user.notif_replies,
             'messages': req.user.notif_messages
         }
+        etag = req.user.etag
+        resp.etag = etag
+        resp.cache_control = ['private', 'no-cache']
+        if req.if_none_match and (etag in req.if_none_match or '*' in req.if_none_match):
+            resp.status = HTTP_NOT_MODIFIED
+            resp.content_type = None
+            return
+        resp.content_type = MEDIA_JSON
+        resp.media = counts
+
+
+class StreamEndpoint:
+    @before(auth_user)
+    @before(auth_required)
+    def on_get(self, req, resp):
+        resp.content_type = 'text/event-stream'
+        resp.cache_control = ['no-cache']
+        resp.stream = events(req.user)
 
 # ACTIONS
 
@@ -637,18 +686,18 @@ class EditEndpoint:
             resp.media = {'status': 'not found'}
             return
         # only author can edit and entries with replies cannot be edited
-        if req.user.id != entry.created_by_id or entry.replies:
+        if req.user.id != entry.created_by_id or entry.descendant_count:
             resp.media = {'status': 'not valid'}
             return
 
         form = req.get_media()
         content = get_content(form)
-        hashtags, links, mentions = get_metadata(content)
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
             if entry.parent_id:
-                errors['content'] = valid_reply(entry.parent, req.user, content, mentions)
+                errors['content'] = valid_reply(entry.parent, req.user, content, tokens.mentions)
             else:
                 errors['content'] = valid_thread(content)
         errors = {k: v for k, v in errors.items() if v}
@@ -659,11 +708,12 @@ class EditEndpoint:
         previous_at_user = entry.at_user
         entry.content = content
         entry.edited_at = utc_timestamp()
-        entry.link = links[0] if links else ''
-        entry.hashtag = hashtags[0] if hashtags else ''
-        entry.at_user = User.objects.filter(username=mentions[0]).first() if mentions else None
+        entry.link = tokens.link
+        entry.hashtag = tokens.hashtag
+        entry.at_user = tokens.at_user
         if previous_at_user != entry.at_user:
             entry.mention_seen_at = .0
+        entry.set_html(tokens)
         entry.save()
         resp.media = build_entry(entry, req.user.saves)
 
@@ -687,6 +737,7 @@ class DeleteEndpoint:
             resp.media = {'status': 'not valid'}
             return
         entry.delete()
+        deleted(entry.created_by_id)
         resp.media = {'status': 'deleted'}
 
 
@@ -730,10 +781,12 @@ class FollowEndpoint:
         if not member:
             resp.media = {'status': 'not found'}
             return
-        _, is_new = Bond.objects.get_or_create(
+        bond, is_new = Bond.objects.get_or_create(
             created_by=req.user, to_user=member,
             defaults={'created_at': utc_timestamp()}
         )
+        if is_new:
+            bond.fan_in()
         if is_new and member != req.user:
             send_push(
                 member,
@@ -756,6 +809,7 @@ class UnfollowEndpoint:
             resp.media = {'status': 'not found'}
             return
         Bond.objects.filter(created_by=req.user, to_user=member).delete()
+        Feed.objects.filter(user=req.user, post__created_by=member).delete()
         resp.media = {'status': 'follow'}
 
 
@@ -0,0 +1,60 @@
+from random import sample
+
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from app.models import Post, User
+
+KEY = 'directory'
+SAMPLE_KEY = 'directory:sample'
+PAGE = 120  # members per page
+SAMPLE = 24  # members with emoji, picked from on the about page
+
+
+def shard(username):
+    first = username[:1]
+    return first if first.isalpha() else '#'
+
+
+def load_directory():
+    """Members who posted, by username in shards of the first letter.
+
+    The snapshot lives in the cache until registration, a first or last
+    post or a profile change forgets it.
+    """
+    shards = cache.get(KEY)
+    if shards is None:
+        members = User.objects.filter(
+            Exists(Post.objects.filter(created_by=OuterRef('id')))
+        ).order_by('username').values_list('emoji', 'username')
+        shards = {}
+        for emoji, username in members:
+            shards.setdefault(shard(username), []).append((emoji, username))
+        cache.set(KEY, shards, 3600)
+    return shards
+
+
+def load_sample():
+    """Ids of members with emoji, small enough to read on every about page."""
+    ids = cache.get(SAMPLE_KEY)
+    if ids is None:
+        ids = list(User.objects.exclude(id__in=[1, 2]).exclude(emoji='').values_list('id', flat=True))
+        ids = sample(ids, min(len(ids), SAMPLE))
+        cache.set(SAMPLE_KEY, ids, 3600)
+    return ids
+
+
+def forget_directory():
+    cache.delete_many([KEY, SAMPLE_KEY])
+
+
+def posted(user):
+    """Forget the directory when a member publishes for the first time."""
+    if len(Post.objects.filter(created_by=user).values_list('id')[:2]) == 1:
+        forget_directory()
+
+
+def deleted(user):
+    """Forget the directory when a member deletes their last post."""
+    if not Post.objects.filter(created_by=user).exists():
+        forget_directory()
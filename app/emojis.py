@@ -0,0 +1,85 @@
+import re
+
+from emoji import EMOJI_DATA
+from emoji.unicode_codes import STATUS
+
+# tables are built once from the emoji package, :name: to emoji and back
+EMOJIS = {}
+HEXCODES = {}
+TRIE = {}
+SELECTORS = '\ufe0e\ufe0f'  # dropped when not part of an emoji, as the library does
+for emoji, data in EMOJI_DATA.items():
+    if data['status'] <= STATUS['fully_qualified']:
+        EMOJIS.setdefault(data['en'], emoji)
+    HEXCODES[emoji] = "-".join(f"{ord(c):04X}" for c in emoji)
+    node = TRIE
+    for char in emoji:
+        node = node.setdefault(char, {})
+    node[''] = data['en']
+
+CODES = frozenset(EMOJIS)
+NAME = re.compile(':[%s]+:' % re.escape(''.join(sorted({c for code in CODES for c in code[1:-1]}))))
+
+
+def emojize(text):
+    """Replace :name: codes with emoji."""
+    if ':' not in text:
+        return text
+    return NAME.sub(lambda match: EMOJIS.get(match.group(), match.group()), text)
+
+
+def demojize(text):
+    """Replace emoji with :name: codes, longest match first."""
+    if text.isascii():
+        return text
+    parts = []
+    start = i = 0
+    while i < len(text):
+        node = TRIE.get(text[i])
+        if not node:
+            if text[i] in SELECTORS:
+                parts.append(text[start:i])
+                start = i + 1
+            i += 1
+            continue
+        end, code = i + 1, node.get('')
+        j = i + 1
+        while j < len(text) and text[j] in node:
+            node = node[text[j]]
+            j += 1
+            if '' in node:
+                end, code = j, node['']
+        if code:
+            parts += [text[start:i], code]
+            start = i = end
+        else:
+            if text[i] in SELECTORS:
+                parts.append(text[start:i])
+                start = i + 1
+            i += 1
+    parts.append(text[start:])
+    return ''.join(parts)
+
+
+def has_emoji(text):
+    """Check if text holds any emoji."""
+    if text.isascii():
+        return False
+    for i, char in enumerate(text):
+        node = TRIE.get(char)
+        if not node:
+            continue
+        if '' in node:
+            return True
+        for char in text[i + 1:]:
+            node = node.get(char)
+            if not node:
+                break
+            if '' in node:
+                return True
+    return False
+
+
+def hexcode(emoji):
+    """Get hexcode for an emoji, openmoji names images by it."""
+    return HEXCODES.get(emoji) or "-".join(f"{ord(c):04X}" for c in emoji)
@@ -1,18 +1,11 @@
 from datetime import date, datetime, timezone
-from string import ascii_letters, digits
 
 from tldextract import extract
 
+from app.tokens import Tokens
 from project.vars import LINKS
 
 
-def hexcode(emoji):
-    """Get hexcode for an emoji."""
-    #  rjust(4, '0') is necessary to convert "2A" to "002A"
-    codes = [hex(ord(e))[2:].upper().rjust(4, '0') for e in emoji]
-    return "-".join(codes)
-
-
 def enumerize(links):
     """Enumerate social links."""
     keys = sorted(links)  # eg. github
@@ -84,60 +77,10 @@ def superscript(number):
     return text
 
 
+# bump when parser output changes, then run manage.py render
+PARSER_VERSION = 2
+
+
 def parser(text):
     """Convert plain text to HTML."""
-    limits = digits + ascii_letters + "_"
-    # unicode xml safe
-    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-    # replace &nbsp; (160) with space (32)
-    text = text.replace(chr(160), chr(32))
-    # split text in words and parse each
-    words = []
-    for word in text.split():
-        # unwrap word
-        endswith = ""
-        startswith = ""
-        if word.endswith(('...', '!!!', '???')):
-            endswith = word[-3:]
-            word = word[:-3]
-        if word.endswith(('..', '!!', '??')):
-            endswith = word[-2:]
-            word = word[:-2]
-        if word.endswith(('.', ',', '!', '?', ':', ';')):
-            endswith = word[-1:]
-            word = word[:-1]
-        if word.endswith((')', ']', '}', "'", '"')):
-            endswith = word[-1:] + endswith
-            word = word[:-1]
-        if word.startswith(('(', '[', '{', "'", '"')):
-            startswith = word[:1]
-            word = word[1:]
-        if word.endswith("'s"):
-            endswith = word[-2:] + endswith
-            word = word[:-2]
-        # replace word
-        if word.startswith(('http://', 'https://')):
-            protocol, separator, address = word.partition('://')
-            if address.startswith('www.'):
-                address = address[4:]
-            if address.endswith('/'):
-                address = address[:-1]
-            if len(address) > 21:
-                address = address[:18] + '...'
-            if address:
-                safe_url = word.replace('"', '&quot;').replace("'", '&#x27;')
-                word = f'<a href="{safe_url}" rel="external">{address}</a>'
-        elif word.startswith('@'):
-            handle = word[1:]
-            if handle and all(c in limits for c in handle):
-                word = f'<a href="/{handle}" rel="author">@{handle}</a>'
-        elif word.startswith('#'):
-            handle = word[1:]
-            if handle and all(c in digits for c in handle):
-                word = f'<a href="/reply/{handle}" rel="bookmark">#{handle}</a>'
-            elif handle and all(c in digits + ascii_letters for c in handle):
-                word = f'<a href="/discover?q=%23{handle}" rel="tag">#{handle}</a>'
-        # wrap word
-        word = startswith + word + endswith
-        words.append(word)
-    return " ".join(words)
+    return Tokens(text).html
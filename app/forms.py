@@ -1,8 +1,6 @@
-from string import ascii_letters, digits
-
-from emoji import demojize
 from unidecode import unidecode
 
+from app.emojis import demojize
 from project.vars import COUNTRIES
 
 
@@ -35,35 +33,3 @@ def get_name(form, field):
     words = [word.strip() for word in value.split()]
     return " ".join(words)
 
-
-def get_metadata(text):
-    limits = digits + ascii_letters + "_"
-    hashtags, links, mentions = [], [], []
-    for word in text.split():
-        if word.endswith(('...', '!!!', '???')):
-            word = word[:-3]
-        if word.endswith(('..', '!!', '??')):
-            word = word[:-2]
-        if word.endswith(('.', ',', '!', '?', ':', ';')):
-            word = word[:-1]
-        if word.endswith((')', ']', '}', "'", '"')):
-            word = word[:-1]
-        if word.startswith(('(', '[', '{', "'", '"')):
-            word = word[1:]
-        if word.endswith("'s"):
-            word = word[:-2]
-        if word.startswith(('http://', 'https://')):
-            protocol, separator, address = word.partition('://')
-            if "." in address:
-                links.append(word.lower())
-        if word.startswith('@'):
-            handle = word[1:]
-            if handle and all(c in limits for c in handle):
-                mentions.append(handle.lower())
-        if word.startswith('#'):
-            handle = word[1:]
-            if handle and all(c in digits for c in handle):
-                continue
-            elif handle and all(c in digits + ascii_letters for c in handle):
-                hashtags.append(handle.lower())
-    return hashtags, links, mentions
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+SIZE = 10000  # fragments kept per process
+
+
+class LRU:
+    """Least recently used fragments, shared by the threads of a process."""
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class FragmentCache(Extension):
+    """Caches the output of {% cache key, ... %} blocks.
+
+    Keys are the given values plus the template version v, so whatever the
+    block shows has to be in its key. Fragments are kept in process and in
+    caches['fragments'] when settings define it, shared by all workers.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragments=LRU())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('fragment', [nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def fragment(self, parts, caller):
+        key = ":".join(str(part) for part in [self.environment.globals['v'], *parts])
+        value = self.environment.fragments.get(key)
+        if value is not None:
+            return value
+        shared = shared_cache()
+        if shared:
+            digest = 'fragment:' + md5(key.encode()).hexdigest()
+            value = shared.get(digest)
+        if value is None:
+            value = caller()
+            if shared:
+                shared.set(digest, str(value))
+        value = Markup(value)
+        self.environment.fragments.set(key, value)
+        return value
+
+
+def shared_cache():
+    return caches['fragments'] if 'fragments' in settings.CACHES else None
@@ -1,20 +1,84 @@
+from atexit import register
+from threading import Lock
+from time import monotonic
+
 from falcon import HTTPFound, HTTPUnauthorized
 
 from app.models import User
+from app.utils import utc_timestamp
 from project.settings import FERNET
 
+FIELDS = [field.attname for field in User._meta.concrete_fields]
+# snapshots for reading, writes must name their update_fields
+IDENTITIES = {}  # token: (expires, field values)
+IDENTITIES_TTL = 60
+IDENTITIES_SIZE = 4096
+SEEN = {}  # user id: seen_at, waiting for the flush
+LAST_SEEN = {}  # user id: seen_at written by this process, snapshots lag behind
+SEEN_FLUSH = 5
+FLUSHED = {'at': monotonic()}
+LOCK = Lock()  # the ASGI pool runs hooks in threads
 
-def auth_user(req, resp, resource, params):
-    token = req.headers.get('AUTHORIZATION', '').replace('Bearer ', '')
-    token = token if token else req.cookies.get('identity', '')
+
+def get_user(token):
+    now = monotonic()
+    expires, values = IDENTITIES.get(token, (0, None))
+    if expires > now:
+        return User.from_db('default', FIELDS, values)
     try:
-        identity = FERNET.decrypt(token.encode()).decode() if token else 0
+        identity = FERNET.decrypt(token.encode()).decode()
     except Exception as e:
         print(e)
-        identity = 0
-    req.user = User.objects.filter(id=identity).first()
+        return None
+    user = User.objects.filter(id=identity).first()
+    if user:
+        with LOCK:
+            if len(IDENTITIES) >= IDENTITIES_SIZE:
+                IDENTITIES.pop(next(iter(IDENTITIES)))
+            IDENTITIES[token] = (now + IDENTITIES_TTL, [getattr(user, f) for f in FIELDS])
+    return user
+
+
+def forget_user(user):
+    """Drop cached identities after the user is changed or deleted."""
+    with LOCK:
+        for token, (expires, values) in list(IDENTITIES.items()):
+            if values[0] == user.id:
+                IDENTITIES.pop(token, None)
+
+
+def set_seen(user):
+    user.seen_at = max(user.seen_at, LAST_SEEN.get(user.id, 0))
+    if utc_timestamp() - user.seen_at > 60:
+        user.seen_at = utc_timestamp()
+        with LOCK:
+            if len(LAST_SEEN) >= IDENTITIES_SIZE:
+                LAST_SEEN.pop(next(iter(LAST_SEEN)))
+            LAST_SEEN[user.id] = SEEN[user.id] = user.seen_at
+
+
+@register
+def flush_seen():
+    with LOCK:
+        seen = SEEN.copy()
+        SEEN.clear()
+        FLUSHED['at'] = monotonic()
+    if not seen:
+        return
+    User.objects.bulk_update(
+        [User(id=user_id, seen_at=seen_at) for user_id, seen_at in seen.items()],
+        ['seen_at']
+    )
+
+
+def auth_user(req, resp, resource, params):
+    token = req.get_header('Authorization', default='').replace('Bearer ', '')
+    token = token if token else req.cookies.get('identity', '')
+    req.user = get_user(token) if token else None
     if req.user:
-        req.user.set_seen()
+        set_seen(req.user)
+    if SEEN and monotonic() - FLUSHED['at'] > SEEN_FLUSH:
+        flush_seen()
 
 
 def login_required(req, resp, resource, params):
@@ -1,19 +1,28 @@
 from datetime import datetime, timezone
+from pathlib import Path
 from textwrap import shorten
 from urllib.parse import quote_plus
 
-from emoji import emojize
-from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, ModuleLoader
 
-from app.filters import age, enumerize, hexcode, parser, timeago
+from app.emojis import emojize, hexcode
+from app.filters import age, enumerize, parser, timeago
+from app.fragments import FragmentCache
 from app.utils import utc_timestamp
 from project.settings import DEBUG
 
-env = Environment(autoescape=True)
+BUFFER = 32  # template events per chunk
+COMPILED = Path('compiled')  # made by the templates command
+SOURCES = FileSystemLoader('templates')
+
+env = Environment(autoescape=True, extensions=[FragmentCache])
 
 env.auto_reload = DEBUG
-env.bytecode_cache = FileSystemBytecodeCache()
-env.loader = FileSystemLoader('templates')
+if DEBUG or not COMPILED.exists():
+    env.bytecode_cache = FileSystemBytecodeCache()
+    env.loader = SOURCES
+else:
+    env.loader = ModuleLoader(COMPILED)
 
 env.filters['age'] = age
 env.filters['cap'] = lambda notif: "*" if notif > 9 else str(notif)
@@ -29,7 +38,13 @@ env.filters['shortdate'] = lambda ts: timeago(utc_timestamp() - ts)
 env.filters['shorten'] = lambda txt, w: shorten(txt, w, placeholder="...")
 
 env.globals['brand'] = "Subreply"
-env.globals['v'] = 287
+env.globals['v'] = 288
+
+
+def warmup():
+    """Load every template, workers forked afterwards share them."""
+    for name in SOURCES.list_templates():
+        env.get_template(name)
 
 
 def render(page, **kwargs):
@@ -37,3 +52,13 @@ def render(page, **kwargs):
         print('\n---', page, kwargs.get('view', ''))
     template = env.get_template(f'pages/{page}.html')
     return template.render(**kwargs)
+
+
+def stream(page, **kwargs):
+    """Render a page in chunks for resp.stream, the head leaves first."""
+    if DEBUG:
+        print('\n---', page, kwargs.get('view', ''), 'stream')
+    chunks = env.get_template(f'pages/{page}.html').stream(**kwargs)
+    chunks.enable_buffering(BUFFER)
+    for chunk in chunks:
+        yield chunk.encode()
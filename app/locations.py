@@ -0,0 +1,99 @@
+from array import array
+from heapq import nsmallest
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from struct import pack, unpack_from
+from zlib import crc32
+
+PATH = Path(__file__).parent.parent / "static" / "locations.bin"
+MAGIC = b'LOC3'
+
+
+def write_locations(cities, populations, path=PATH):
+    """Table of "Country" and "City, Country" names for Locations.
+
+    Layout is the magic, the counts of names and slots, offsets of the
+    names, their rank by population then length, a hash table of name
+    indexes and the names. Names are sorted by lowercase bytes so prefix
+    lookups ignore case.
+    """
+    names = list(cities)
+    names += [f"{city}, {country}" for country, city_list in cities.items() for city in city_list]
+    names = sorted((name.encode() for name in names), key=lambda name: (name.lower(), name))
+    offsets, blob = array('I', [0]), bytearray()
+    for name in names:
+        blob += name
+        offsets.append(len(blob))
+    order = sorted(range(len(names)), key=lambda i: (-populations.get(names[i].decode(), 0), len(names[i]), i))
+    ranks = array('I', [0]) * len(names)
+    for rank, index in enumerate(order):
+        ranks[index] = rank
+    size = 1 << (len(names) * 2).bit_length()  # under half full
+    slots = array('I', [0]) * size
+    for index, name in enumerate(names):
+        slot = crc32(name) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = index + 1
+    temp = path.with_suffix('.tmp')
+    with open(temp, 'wb') as file:
+        file.write(MAGIC + pack('<II', len(names), size))
+        file.write(offsets.tobytes() + ranks.tobytes() + slots.tobytes() + blob)
+    temp.replace(path)
+    return len(names)
+
+
+class Locations:
+    """Memory-mapped names, pages are shared by every worker."""
+
+    def __init__(self, path=PATH):
+        with open(path, 'rb') as file:
+            self.map = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, self.count, self.size = unpack_from('<4sII', self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a locations table")
+        view = memoryview(self.map)
+        start = 12
+        self.offsets = view[start:start + 4 * (self.count + 1)].cast('I')
+        start += 4 * (self.count + 1)
+        self.ranks = view[start:start + 4 * self.count].cast('I')
+        start += 4 * self.count
+        self.slots = view[start:start + 4 * self.size].cast('I')
+        self.names = start + 4 * self.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.map[self.names + self.offsets[index]:self.names + self.offsets[index + 1]]
+
+    def __contains__(self, name):
+        key = name.encode()
+        mask = self.size - 1
+        slot = crc32(key) & mask
+        while index := self.slots[slot]:
+            if self[index - 1] == key:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    def find(self, key):
+        """Index of the first name not below key, compared in lowercase bytes."""
+        data, offsets, names = self.map, self.offsets, self.names
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if data[names + offsets[middle]:names + offsets[middle + 1]].lower() < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def complete(self, prefix, limit=10):
+        """Names starting with prefix, ascii case ignored, most populated then shortest first."""
+        key = prefix.encode().lower()
+        start, end = self.find(key), self.find(key + b'\xff')  # no utf-8 byte is 0xff
+        best = nsmallest(limit, range(start, end), key=self.ranks.__getitem__)
+        return [self[index].decode() for index in best]
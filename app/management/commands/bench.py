@@ -0,0 +1,363 @@
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from random import choice, randint, seed
+from string import ascii_letters, digits
+from time import perf_counter
+from tracemalloc import get_traced_memory, start as trace, stop as untrace
+
+import emoji
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from app import emojis, jinja
+from app.locations import Locations
+from app.models import Post, User
+from app.resources import DiscoverResource
+from app.search import search_posts
+from app.threads import load_thread
+from app.tokens import Tokens
+from app.utils import utc_timestamp
+from app.validation import valid_reply
+
+LOADS = {
+    'json': "from json import load; CITIES = load(open('static/cities.json'))",
+    'mmap': "from app.locations import Locations; LOCATIONS = Locations()",
+}
+PROBE = (
+    "from time import perf_counter; rss = lambda: int(open('/proc/self/statm').read().split()[1]) * 4096; "
+    "before, start = rss(), perf_counter(); {load}; print(perf_counter() - start, rss() - before)"
+)
+
+WORDS = [
+    "about", "after", "again", "apple", "berlin", "bread", "city", "coffee",
+    "daily", "django", "early", "falcon", "garden", "house", "jazz", "kernel",
+    "linux", "music", "night", "ocean", "paris", "python", "quiet", "river",
+    "rust", "small", "summer", "today", "train", "water", "winter", "world"
+]
+
+
+# the write path before Tokens, kept to compare against
+def old_metadata(text):
+    limits = digits + ascii_letters + "_"
+    hashtags, links, mentions = [], [], []
+    for word in text.split():
+        if word.endswith(('...', '!!!', '???')):
+            word = word[:-3]
+        if word.endswith(('..', '!!', '??')):
+            word = word[:-2]
+        if word.endswith(('.', ',', '!', '?', ':', ';')):
+            word = word[:-1]
+        if word.endswith((')', ']', '}', "'", '"')):
+            word = word[:-1]
+        if word.startswith(('(', '[', '{', "'", '"')):
+            word = word[1:]
+        if word.endswith("'s"):
+            word = word[:-2]
+        if word.startswith(('http://', 'https://')):
+            protocol, separator, address = word.partition('://')
+            if "." in address:
+                links.append(word.lower())
+        if word.startswith('@'):
+            handle = word[1:]
+            if handle and all(c in limits for c in handle):
+                mentions.append(handle.lower())
+        if word.startswith('#'):
+            handle = word[1:]
+            if handle and all(c in digits for c in handle):
+                continue
+            elif handle and all(c in digits + ascii_letters for c in handle):
+                hashtags.append(handle.lower())
+    return hashtags, links, mentions
+
+
+def old_parser(text):
+    limits = digits + ascii_letters + "_"
+    # unicode xml safe
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    # replace &nbsp; (160) with space (32)
+    text = text.replace(chr(160), chr(32))
+    # split text in words and parse each
+    words = []
+    for word in text.split():
+        # unwrap word
+        endswith = ""
+        startswith = ""
+        if word.endswith(('...', '!!!', '???')):
+            endswith = word[-3:]
+            word = word[:-3]
+        if word.endswith(('..', '!!', '??')):
+            endswith = word[-2:]
+            word = word[:-2]
+        if word.endswith(('.', ',', '!', '?', ':', ';')):
+            endswith = word[-1:]
+            word = word[:-1]
+        if word.endswith((')', ']', '}', "'", '"')):
+            endswith = word[-1:] + endswith
+            word = word[:-1]
+        if word.startswith(('(', '[', '{', "'", '"')):
+            startswith = word[:1]
+            word = word[1:]
+        if word.endswith("'s"):
+            endswith = word[-2:] + endswith
+            word = word[:-2]
+        # replace word
+        if word.startswith(('http://', 'https://')):
+            protocol, separator, address = word.partition('://')
+            if address.startswith('www.'):
+                address = address[4:]
+            if address.endswith('/'):
+                address = address[:-1]
+            if len(address) > 21:
+                address = address[:18] + '...'
+            if address:
+                safe_url = word.replace('"', '&quot;').replace("'", '&#x27;')
+                word = f'<a href="{safe_url}" rel="external">{address}</a>'
+        elif word.startswith('@'):
+            handle = word[1:]
+            if handle and all(c in limits for c in handle):
+                word = f'<a href="/{handle}" rel="author">@{handle}</a>'
+        elif word.startswith('#'):
+            handle = word[1:]
+            if handle and all(c in digits for c in handle):
+                word = f'<a href="/reply/{handle}" rel="bookmark">#{handle}</a>'
+            elif handle and all(c in digits + ascii_letters for c in handle):
+                word = f'<a href="/discover?q=%23{handle}" rel="tag">#{handle}</a>'
+        # wrap word
+        word = startswith + word + endswith
+        words.append(word)
+    return " ".join(words)
+
+
+def timeit(func, runs=5):
+    """Best of runs in milliseconds."""
+    best = float('inf')
+    for _ in range(runs):
+        start = perf_counter()
+        func()
+        best = min(best, perf_counter() - start)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = "Benchmark hot paths on synthetic data, changes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['search', 'threads', 'render', 'stream', 'tokens', 'emoji', 'locations', 'http'])
+        parser.add_argument('--posts', type=int, nargs='+', default=[100000, 1000000])
+        # http compares running servers, e.g. gunicorn and uvicorn
+        parser.add_argument('--servers', nargs='+', default=['http://127.0.0.1:8000', 'http://127.0.0.1:8002'])
+        parser.add_argument('--paths', nargs='+', default=['/api/feed', '/api/discover', '/api/notifications'])
+        parser.add_argument('--token', default='')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=32)
+
+    def fill(self, user, total, batch=10000):
+        seed(total)
+        created = Post.objects.count()
+        while created < total:
+            size = min(batch, total - created)
+            Post.objects.bulk_create([
+                Post(
+                    created_by=user,
+                    created_at=utc_timestamp(),
+                    content=" ".join(choice(WORDS) for _ in range(randint(4, 40))),
+                    hashtag=choice(WORDS) if not randint(0, 9) else ''
+                ) for _ in range(size)
+            ])
+            created += size
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE app_post")
+
+    def search(self, total):
+        queries = [["python"], ["paris", "coffee"], ["#jazz"], ["kern"]]
+        for terms in queries:
+            old = Q()
+            for term in terms:
+                old &= Q(content__icontains=term)
+            icontains = timeit(lambda: list(Post.objects.filter(old).order_by('-id')[:16]))
+            indexed = timeit(lambda: list(search_posts(Post.objects.all(), terms)[:16]))
+            print(f"  {' '.join(terms):<14} icontains {icontains:8.2f}ms  search {indexed:8.2f}ms")
+
+    def threads(self, total):
+        user = User.objects.get(username='benchmark')
+        for depth in [10, 100, 250]:
+            root = leaf = Post.objects.create(created_by=user, content=f"deep {depth}")
+            start = perf_counter()
+            for level in range(depth):
+                leaf = Post.objects.create(created_by=user, parent=leaf, content=f"level {level}")
+                leaf.set_ancestors()
+            reply = (perf_counter() - start) / depth * 1000
+            ancestors = timeit(lambda: list(Post.objects.filter(id__in=leaf.ancestor_ids)))
+            descendants = timeit(lambda: root.descendants.count())
+            duplicate = timeit(lambda: valid_reply(leaf, user, "level 0", []))
+            with CaptureQueriesContext(connection) as queries:
+                load_thread(Post.objects.select_related('created_by'), leaf.parent_id)
+            thread = timeit(lambda: load_thread(Post.objects.select_related('created_by'), leaf.parent_id))
+            print(f"  depth {depth:<4} reply {reply:6.2f}ms  ancestors {ancestors:6.2f}ms  "
+                  f"descendants {descendants:6.2f}ms  duplicate {duplicate:6.2f}ms  "
+                  f"thread {thread:6.2f}ms in {len(queries)} queries")
+            if len(queries) != 2:
+                raise CommandError("Thread queries grow with depth")
+
+    def render(self, total):
+        user = User.objects.get(username='benchmark')
+        discover = DiscoverResource()
+        entries = list(discover.fetch_entries(['python'])[:16])
+        for entry in entries:
+            entry.set_html()
+
+        def page():
+            return jinja.render(
+                page='regular', view='discover', number=1, cursor=None, q='python',
+                user=user, entries=entries, errors={}, placeholder=discover.placeholder
+            )
+
+        def cold():
+            jinja.env.fragments.clear()
+            page()
+
+        page()
+        print(f"  discover page  cold {timeit(cold):6.2f}ms  cached {timeit(page):6.2f}ms")
+
+    def stream(self, total):
+        user = User.objects.get(username='benchmark')
+        if not User.objects.filter(username='bench0').exists():
+            members = User.objects.bulk_create([
+                User(username=f'bench{i}', first_name=f'Bench{i}', email=f'bench{i}@subreply.com')
+                for i in range(5000)
+            ])
+            Post.objects.bulk_create([Post(created_by=member, content="hello") for member in members])
+        discover = DiscoverResource()
+        entries = list(discover.fetch_entries(['python'])[:16])
+        for entry in entries:
+            entry.set_html()
+
+        def page(name):
+            if name == 'directory':
+                users = User.objects.exclude(posts=None).order_by('-id').values_list('emoji', 'username')
+                return 'directory', dict(view='about', user=user, users=users)
+            return 'regular', dict(
+                view='discover', number=1, cursor=None, q='python', user=user,
+                entries=entries, errors={}, placeholder=discover.placeholder
+            )
+
+        def measure(name, mode):
+            template, kwargs = page(name)
+            trace()
+            begin = perf_counter()
+            if mode == 'stream':
+                chunks = jinja.stream(template, **kwargs)
+            else:
+                chunks = iter([jinja.render(template, **kwargs).encode()])
+            size = len(next(chunks))
+            first = perf_counter() - begin
+            for chunk in chunks:
+                size += len(chunk)
+            elapsed = perf_counter() - begin
+            peak = get_traced_memory()[1]
+            untrace()
+            return first * 1000, elapsed * 1000, peak / 1024, size / 1024
+
+        for name in ['directory', 'discover']:
+            measure(name, 'render')  # compiles the templates
+            for mode in ['render', 'stream']:
+                first, elapsed, peak, size = measure(name, mode)
+                print(f"  {name:<10} {mode:<7} first byte {first:7.2f}ms  total {elapsed:7.2f}ms  "
+                      f"peak {peak:8.1f}KB  page {size:6.1f}KB")
+
+    def tokens(self):
+        seed(640)
+        words = WORDS + ["@benchmark", "#python", "(#42)", "https://subreply.com/about", "it's", "done..."]
+        posts = []
+        for _ in range(1000):
+            post = ""
+            while len(post) < 640:
+                post += choice(words) + " "
+            posts.append(post[:640])
+        # handlers used to read metadata twice, for validation and the post, then parse
+        old = timeit(lambda: [
+            (old_metadata(post), old_metadata(post), old_parser(post)) for post in posts
+        ]) / len(posts) * 1000
+        new = timeit(lambda: [Tokens(post) for post in posts]) / len(posts) * 1000
+        print(f"A 640 characters post: metadata and parser {old:.1f}us  Tokens {new:.1f}us  {old / new:.1f}x")
+
+    def emoji(self):
+        seed(640)
+        codes = sorted(emojis.CODES)
+        texts = []
+        for _ in range(1000):
+            words = [choice(WORDS) for _ in range(8)] + [choice(codes), "10:30"]
+            texts.append(" ".join(words))
+        for name in ['emojize', 'demojize']:
+            if name == 'demojize':
+                texts = [emoji.emojize(text) for text in texts]
+            for module in [emoji, emojis]:
+                func = getattr(module, name)
+                best = timeit(lambda: [func(text) for text in texts]) / len(texts) * 1000
+                print(f"{module.__name__}.{name}: {best:.2f}us")
+
+    def locations(self):
+        for name, load in LOADS.items():
+            out = subprocess.run([sys.executable, '-c', PROBE.format(load=load)], capture_output=True, text=True)
+            elapsed, rss = out.stdout.split()
+            print(f"Locations {name:<5} load {float(elapsed) * 1000:7.2f}ms  rss {int(rss) / 1024:8.1f}KB")
+        with open('static/cities.json') as file:
+            cities = json.load(file)
+        seed(640)
+        names = [f"{choice(v)}, {k}" for k, v in sorted(cities.items()) for _ in range(4)]
+        locations = Locations()
+        scan = timeit(lambda: [city in cities[country] for city, country in (n.split(", ") for n in names)])
+        hashed = timeit(lambda: [name in locations for name in names])
+        print(f"Lookup of {len(names)} cities  scan {scan:7.2f}ms  hashed {hashed:7.2f}ms")
+        for prefix in ['s', 'sa', 'san', 'paris', 'zz']:
+            best = timeit(lambda: locations.complete(prefix), runs=20) * 1000
+            print(f"  complete {prefix!r:<8} {best:8.1f}us  {locations.complete(prefix)[:3]}")
+
+    def http(self, options):
+        headers = {'Authorization': f"Bearer {options['token']}"} if options['token'] else {}
+        total = options['requests']
+
+        def fetch(url):
+            start = perf_counter()
+            try:
+                status = requests.get(url, headers=headers, timeout=30).status_code
+            except requests.RequestException:
+                status = 0
+            return perf_counter() - start, status
+
+        for server in options['servers']:
+            print(f"Http at {server} with {options['concurrency']} clients:")
+            for path in options['paths']:
+                start = perf_counter()
+                with ThreadPoolExecutor(options['concurrency']) as pool:
+                    results = list(pool.map(fetch, [server + path] * total))
+                elapsed = perf_counter() - start
+                times = sorted(t * 1000 for t, _ in results)
+                errors = sum(1 for _, status in results if not 200 <= status < 400)
+                print(
+                    f"  {path:<20} {total / elapsed:8.1f} req/s  p50 {times[total // 2]:8.2f}ms  "
+                    f"p99 {times[total * 99 // 100]:8.2f}ms  errors {errors}"
+                )
+
+    def handle(self, *args, **options):
+        if options['target'] == 'http':
+            self.http(options)
+            return
+        if options['target'] in ['tokens', 'emoji', 'locations']:
+            getattr(self, options['target'])()
+            return
+        with transaction.atomic():
+            user = User.objects.create(
+                username='benchmark', first_name='Bench', email='bench@subreply.com'
+            )
+            for total in sorted(options['posts']):
+                self.fill(user, total)
+                print(f"{options['target'].title()} with {total} posts:")
+                getattr(self, options['target'])(total)
+            transaction.set_rollback(True)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import CharField, Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, Concat
+
+from app.models import Post, subcount
+
+
+class Command(BaseCommand):
+    help = "Reconcile reply counters on posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift.")
+
+    def handle(self, *args, **options):
+        prefix = Concat(OuterRef('path'), Cast(OuterRef('id'), CharField()), Value('/'))
+        # descendants share the root of the outer post
+        counts = Post.objects.filter(path__startswith=prefix).order_by().values('root')
+        descendants = Coalesce(Subquery(counts.annotate(n=Count('*')).values('n')), 0)
+        kids = subcount(Post.objects, 'parent')
+        drifted = Post.objects.annotate(
+            actual_descendants=descendants, actual_kids=kids
+        ).exclude(descendant_count=F('actual_descendants'), kid_count=F('actual_kids'))
+        if options['check']:
+            for post in drifted.order_by('id'):
+                print(f"#{post.id} descendants {post.descendant_count} != {post.actual_descendants}"
+                      f" or kids {post.kid_count} != {post.actual_kids}")
+            print('Drifted:', drifted.count())
+            return
+        ids = list(drifted.values_list('id', flat=True))
+        Post.objects.filter(id__in=ids).update(descendant_count=descendants, kid_count=kids)
+        print('Reconciled:', len(ids))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Bond
+
+
+class Command(BaseCommand):
+    help = "Backfill feeds from existing bonds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Backfill only this username.")
+
+    def handle(self, *args, **options):
+        bonds = Bond.objects.order_by('id')
+        if options['user']:
+            bonds = bonds.filter(created_by__username=options['user'].lower())
+        for bond in bonds.iterator():
+            bond.fan_in()
+        print('Bonds:', bonds.count())
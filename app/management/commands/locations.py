@@ -8,6 +8,8 @@ from collections import defaultdict
 import requests
 from django.core.management.base import BaseCommand
 
+from app.locations import write_locations
+
 NAME = "simplemaps_worldcities_basicv1.77.zip"
 
 
@@ -58,6 +60,7 @@ class Command(BaseCommand):
         print("Converting CSV file to JSON files")
         cities = defaultdict(set)
         countries = {}
+        populations = defaultdict(int)
         maxim, location = 0, ""
         reader = csv.DictReader(self.csv_file)
         for row in reader:
@@ -67,6 +70,9 @@ class Command(BaseCommand):
             if name.count(", ") == 1:
                 cities[country].add(city)
                 countries[row['iso2']] = country
+                population = int(float(row['population'] or 0))
+                populations[name] = max(populations[name], population)
+                populations[country] += population
                 if len(name) > maxim:
                     maxim, location = len(name), name
 
@@ -85,6 +91,15 @@ class Command(BaseCommand):
         with open('static/countries.json', 'w') as file:
             json.dump(countries, file, sort_keys=True, indent=4)
 
+        print('Locations', write_locations(cities, populations))
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offline', action='store_true', help="Rebuild the table from cities.json.")
+
     def handle(self, *args, **options):
+        if options['offline']:
+            with open('static/cities.json') as file:
+                print('Locations', write_locations(json.load(file), {}))
+            return
         self.get_csv()
         self.convert()
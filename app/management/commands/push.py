@@ -0,0 +1,21 @@
+from time import sleep
+
+from django.core.management.base import BaseCommand
+
+from app.push import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver queued push notifications."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+        parser.add_argument('--batch', type=int, default=100)
+
+    def handle(self, *args, **options):
+        while True:
+            count = drain(options['batch'])
+            if options['once'] and not count:
+                break
+            if not count:
+                sleep(1)
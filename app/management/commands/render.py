@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.filters import PARSER_VERSION
+from app.models import Post
+
+
+class Command(BaseCommand):
+    help = "Render stored post HTML made by an older parser."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Render every post.")
+        parser.add_argument('--batch', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not options['all']:
+            posts = posts.exclude(html_version=PARSER_VERSION)
+        last_id, rendered = 0, 0
+        while batch := list(posts.filter(id__gt=last_id).order_by('id').only('id', 'content')[:options['batch']]):
+            for post in batch:
+                post.set_html()
+            Post.objects.bulk_update(batch, ['html', 'emojized', 'html_version'])
+            last_id = batch[-1].id
+            rendered += len(batch)
+        print('Rendered:', rendered)
@@ -0,0 +1,53 @@
+import json
+from zlib import crc32
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+
+from app.models import Post, User
+from app.sitemaps import BASE, SITEMAPS, SIZE, write_index, write_shard
+
+
+class Command(BaseCommand):
+    help = "Write gzip sitemap shards and their index, unchanged shards are kept."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rewrite every shard.")
+
+    def handle(self, *args, **options):
+        SITEMAPS.mkdir(exist_ok=True)
+        manifest = SITEMAPS / 'sitemaps.json'
+        old = {} if options['all'] or not manifest.exists() else json.loads(manifest.read_text())
+        users = User.objects.filter(Exists(Post.objects.filter(created_by=OuterRef('id'))))
+        posts = Post.objects.filter(Q(kid_count__gt=0) | Q(parent__isnull=False))
+        sources = [
+            ('users', users, 'username', lambda username: f"{BASE}/{username}"),
+            ('posts', posts, 'id', lambda id: f"{BASE}/reply/{id}"),
+        ]
+        shards, written = {}, 0
+        for kind, qs, field, url in sources:
+            # a shard holds an id range, it changes only when its count, ids or usernames do
+            signatures = qs.annotate(shard=F('id') / SIZE).values('shard').annotate(
+                count=Count('id'), total=Sum('id')
+            ).order_by('shard')
+            for row in signatures:
+                name = f"sitemap-{kind}-{row['shard']}.txt.gz"
+                shards[name] = [row['count'], row['total']]
+                start = row['shard'] * SIZE
+                rows = qs.filter(id__gte=start, id__lt=start + SIZE).order_by('id').values_list(field, flat=True)
+                if field != 'id':
+                    # usernames change in place, a checksum of them catches renames
+                    shards[name].append(crc32("\n".join(rows).encode()))
+                if old.get(name) == shards[name] and (SITEMAPS / name).exists():
+                    continue
+                # server-side cursors need a transaction behind pgbouncer
+                with transaction.atomic():
+                    write_shard(name, (url(value) for value in rows.iterator(chunk_size=2000)))
+                written += 1
+        for name in set(old) - set(shards):
+            (SITEMAPS / name).unlink(missing_ok=True)
+        write_index(shards)
+        manifest.write_text(json.dumps(shards))
+        print('Shards:', len(shards))
+        print('Written:', written)
@@ -0,0 +1,15 @@
+from shutil import rmtree
+
+from django.core.management.base import BaseCommand
+
+from app.jinja import COMPILED, SOURCES, env
+
+
+class Command(BaseCommand):
+    help = "Compile templates into modules loaded in production."
+
+    def handle(self, *args, **options):
+        rmtree(COMPILED, ignore_errors=True)
+        names = SOURCES.list_templates()
+        env.overlay(loader=SOURCES).compile_templates(COMPILED, zip=None, ignore_errors=False)
+        print('Compiled:', len(names))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_replies(apps, schema_editor):
+    Post = apps.get_model('app', 'Post')
+    Ancestor = Post.ancestors.through
+
+    def count(qs, field):
+        counts = qs.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        return Coalesce(Subquery(counts.annotate(n=Count('*')).values('n')), 0)
+
+    parents = Post.objects.exclude(parent=None).values('parent_id')
+    Post.objects.filter(id__in=parents).update(
+        descendant_count=count(Ancestor.objects, 'to_post'),
+        kid_count=count(Post.objects, 'parent'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0066_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='descendant_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='kid_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_replies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+INDEX = GinIndex(SearchVector('content', config='simple'), name='post_content_search')
+
+
+def add_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('app', 'Post'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('app', 'Post'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0067_post_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:21
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations, models
+from unidecode import unidecode
+
+INDEX = GinIndex(fields=['search'], name='user_search_trgm', opclasses=['gin_trgm_ops'])
+
+
+def fill_search(apps, schema_editor):
+    User = apps.get_model('app', 'User')
+    users = []
+    for user in User.objects.iterator():
+        fields = [
+            user.username, user.first_name, user.last_name, user.emoji,
+            user.birthday, user.location, user.link, user.description
+        ]
+        user.search = " " + unidecode(" ".join(fields).lower())
+        users.append(user)
+    User.objects.bulk_update(users, ['search'], batch_size=1000)
+
+
+def add_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.add_index(apps.get_model('app', 'User'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('app', 'User'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0068_post_content_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(fill_search, migrations.RunPython.noop),
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK = 10000
+
+
+def replies(Post, last_id):
+    return Post.objects.filter(
+        id__gt=last_id, parent__isnull=False
+    ).order_by('id')[:CHUNK]
+
+
+def fill_paths(apps, schema_editor):
+    Post = apps.get_model('app', 'Post')
+    Ancestor = Post.ancestors.through
+    last_id = 0
+    while ids := list(replies(Post, last_id).values_list('id', flat=True)):
+        ancestors = {}
+        for post_id, ancestor_id in Ancestor.objects.filter(
+            from_post_id__in=ids
+        ).values_list('from_post_id', 'to_post_id'):
+            ancestors.setdefault(post_id, []).append(ancestor_id)
+        Post.objects.bulk_update([
+            Post(id=post_id, root_id=min(chain), path=''.join(f"{i}/" for i in sorted(chain)))
+            for post_id, chain in ancestors.items()
+        ], ['root', 'path'], batch_size=1000)
+        last_id = ids[-1]
+
+
+def fill_ancestors(apps, schema_editor):
+    Post = apps.get_model('app', 'Post')
+    Ancestor = Post.ancestors.through
+    last_id = 0
+    while posts := list(replies(Post, last_id).values_list('id', 'path')):
+        Ancestor.objects.bulk_create([
+            Ancestor(from_post_id=post_id, to_post_id=int(i))
+            for post_id, path in posts for i in path.split('/') if i
+        ], ignore_conflicts=True)
+        last_id = posts[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0069_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='path',
+            field=models.CharField(db_index=True, default='', max_length=2400),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='root',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.post'),
+        ),
+        migrations.RunPython(fill_paths, fill_ancestors),
+    ]
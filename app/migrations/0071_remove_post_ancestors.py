@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0070_post_path'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='post',
+            name='ancestors',
+        ),
+    ]
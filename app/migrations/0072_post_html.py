@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0071_remove_post_ancestors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='emojized',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='html',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='html_version',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -3,10 +3,15 @@ from os import environ
 from django import setup
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.functional import cached_property
+from unidecode import unidecode
 
-from app.utils import utc_timestamp
+from app.emojis import emojize
+from app.filters import PARSER_VERSION
+from app.tokens import Tokens
 
 if not settings.configured:
     environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
@@ -19,6 +24,12 @@ if settings.DEBUG:
     logger.addHandler(logging.StreamHandler())
 
 
+def subcount(qs, field):
+    """Count rows of qs pointing to the outer row through field."""
+    counts = qs.filter(**{field: OuterRef('pk')}).order_by().values(field)
+    return Coalesce(Subquery(counts.annotate(n=Count('*')).values('n')), 0)
+
+
 class User(models.Model):
     username = models.CharField(max_length=15, unique=True)
     first_name = models.CharField(max_length=15)
@@ -39,6 +50,8 @@ class User(models.Model):
     phone = models.JSONField(default=dict)
     social = models.JSONField(default=dict)
 
+    search = models.TextField(default='')
+
     class Meta:
         unique_together = ['emoji', 'first_name', 'last_name']
 
@@ -73,21 +86,39 @@ class User(models.Model):
             return self.first_name[:1] + self.last_name[:1]
         return self.first_name[:3]
 
+    def count_notifs(self):
+        """Unread counters in a single query."""
+        return User.objects.filter(id=self.id).values(
+            notif_followers=subcount(Bond.objects.filter(seen_at=.0), 'to_user'),
+            notif_mentions=subcount(Post.objects.filter(mention_seen_at=.0), 'at_user'),
+            notif_replies=subcount(Post.objects.filter(reply_seen_at=.0), 'to_user'),
+            notif_messages=subcount(Chat.objects.filter(seen_at=.0), 'to_user'),
+        ).first()
+
+    @cached_property
+    def notifs(self):
+        return self.count_notifs()
+
     @cached_property
     def notif_followers(self):
-        return self.followers.filter(seen_at=.0).count()
+        return self.notifs['notif_followers']
 
     @cached_property
     def notif_mentions(self):
-        return self.mentions.filter(mention_seen_at=.0).count()
+        return self.notifs['notif_mentions']
 
     @cached_property
     def notif_replies(self):
-        return self.replies.filter(reply_seen_at=.0).count()
+        return self.notifs['notif_replies']
 
     @cached_property
     def notif_messages(self):
-        return self.received.filter(seen_at=.0).count()
+        return self.notifs['notif_messages']
+
+    @cached_property
+    def etag(self):
+        """Unread counters from the single count query, for ETags and fragment keys."""
+        return "{notif_followers}-{notif_mentions}-{notif_replies}-{notif_messages}".format(**self.notifs)
 
     @cached_property
     def follows(self):
@@ -104,10 +135,13 @@ class User(models.Model):
             social['telephone'] = self.phone['code'] + self.phone['number']
         return social
 
-    def set_seen(self):
-        if utc_timestamp() - self.seen_at > 60:
-            self.seen_at = utc_timestamp()
-            self.save(update_fields=['seen_at'])
+    def set_search(self):
+        """Normalized document for people search, words start after a space."""
+        fields = [
+            self.username, self.first_name, self.last_name, self.emoji,
+            self.birthday, self.location, self.link, self.description
+        ]
+        self.search = " " + unidecode(" ".join(fields).lower())
 
     @property
     def push_sub(self):
@@ -118,8 +152,6 @@ class User(models.Model):
 
 
 class Post(models.Model):
-    ancestors = models.ManyToManyField('self', related_name='descendants',
-                                       symmetrical=False)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True,
                                related_name='kids')
     created_at = models.FloatField(default=.0)
@@ -135,6 +167,14 @@ class Post(models.Model):
     hashtag = models.CharField(max_length=15, default='', db_index=True)
     mention_seen_at = models.FloatField(default=.0, db_index=True)
     reply_seen_at = models.FloatField(default=.0, db_index=True)
+    descendant_count = models.IntegerField(default=0)
+    kid_count = models.IntegerField(default=0)
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True,
+                             related_name='+')
+    path = models.CharField(max_length=2400, default='', db_index=True)
+    html = models.TextField(default='')
+    emojized = models.TextField(default='')
+    html_version = models.IntegerField(default=0, db_index=True)
 
     class Meta:
         unique_together = ['parent', 'created_by']
@@ -142,11 +182,55 @@ class Post(models.Model):
     def __str__(self):
         return self.content
 
+    def set_html(self, tokens=None):
+        """Render content once, on write."""
+        tokens = tokens or Tokens(self.content)
+        self.html = emojize(tokens.html)
+        self.emojized = emojize(self.content)
+        self.html_version = PARSER_VERSION
+
+    @property
+    def ancestor_ids(self):
+        """Ids from the thread down to the parent."""
+        return [int(i) for i in self.path.split('/') if i]
+
+    @property
+    def descendants(self):
+        return Post.objects.filter(path__startswith=f"{self.path}{self.id}/")
+
     def set_ancestors(self):
         if self.parent:
-            self.ancestors.set(list(self.parent.ancestors.all()) + [self.parent])
-        else:
-            self.ancestors.clear()
+            self.root_id = self.parent.root_id or self.parent_id
+            self.path = f"{self.parent.path}{self.parent_id}/"
+            with transaction.atomic():
+                self.save(update_fields=['root', 'path'])
+                Post.objects.filter(
+                    id__in=self.ancestor_ids
+                ).update(descendant_count=F('descendant_count') + 1)
+                Post.objects.filter(
+                    id=self.parent_id
+                ).update(kid_count=F('kid_count') + 1)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Post.objects.filter(
+                id__in=self.ancestor_ids
+            ).update(descendant_count=F('descendant_count') - self.descendant_count - 1)
+            if self.parent_id:
+                Post.objects.filter(
+                    id=self.parent_id
+                ).update(kid_count=F('kid_count') - 1)
+            return super().delete(*args, **kwargs)
+
+    def fan_out(self):
+        """Add post to the feeds of author's followers."""
+        followers = Bond.objects.filter(
+            to_user_id=self.created_by_id
+        ).values_list('created_by_id', flat=True)
+        Feed.objects.bulk_create(
+            [Feed(user_id=user_id, post=self) for user_id in followers],
+            ignore_conflicts=True
+        )
 
 
 class Save(models.Model):
@@ -171,6 +255,26 @@ class Bond(models.Model):
     class Meta:
         unique_together = ['created_by', 'to_user']
 
+    def fan_in(self):
+        """Add followed member's posts to follower's feed."""
+        posts = Post.objects.filter(
+            created_by_id=self.to_user_id
+        ).values_list('id', flat=True)
+        Feed.objects.bulk_create(
+            [Feed(user_id=self.created_by_id, post_id=post_id) for post_id in posts],
+            ignore_conflicts=True, batch_size=1000
+        )
+
+
+class Feed(models.Model):
+    user = models.ForeignKey('User', on_delete=models.CASCADE,
+                             related_name='feed')
+    post = models.ForeignKey('Post', on_delete=models.CASCADE,
+                             related_name='feeds')
+
+    class Meta:
+        unique_together = ['user', 'post']
+
 
 class Chat(models.Model):
     content = models.CharField(max_length=640)
@@ -186,3 +290,11 @@ class Push(models.Model):
     p256dh = models.TextField()
     auth = models.TextField()
     created_at = models.FloatField(default=.0)
+
+
+class Outbox(models.Model):
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='outbox')
+    payload = models.JSONField(default=dict)
+    attempts = models.IntegerField(default=0)
+    created_at = models.FloatField(default=.0)
+    next_at = models.FloatField(default=.0, db_index=True)
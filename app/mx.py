@@ -0,0 +1,73 @@
+from string import ascii_lowercase, digits
+from threading import Event, Lock
+
+from django.core.cache import cache
+from dns.resolver import NXDOMAIN, NoAnswer, resolve
+
+DOMAIN = frozenset(ascii_lowercase + digits + '-.')
+TIMEOUT = 2.0  # seconds a lookup may take, retries included
+FOUND = 3600 * 24  # seconds answers are cached
+MISSING = 3600
+FAILED = 60  # timeouts and broken nameservers are retried soon
+
+
+def query(domain):
+    """Check for MX records with dnspython, raises on failures."""
+    try:
+        return bool(resolve(domain, 'MX', lifetime=TIMEOUT))
+    except (NXDOMAIN, NoAnswer):
+        return False
+
+
+class Flight:
+    def __init__(self):
+        self.done = Event()
+        self.found = False
+
+
+class MX:
+    """Mail exchanger checks cached for every worker.
+
+    Concurrent checks of a domain wait for the first one. Tests can pass
+    a fake query, eg. MX(lambda domain: domain == 'subreply.com').
+    """
+
+    def __init__(self, query=query):
+        self.query = query
+        self.flights = {}  # domain: lookup in progress
+        self.lock = Lock()
+
+    def lookup(self, domain):
+        try:
+            found = self.query(domain)
+        except Exception:
+            return False, FAILED
+        return found, FOUND if found else MISSING
+
+    def check(self, domain):
+        domain = domain.lower().rstrip('.')
+        if not domain or not DOMAIN.issuperset(domain):
+            return False
+        key = f"mx:{domain}"
+        found = cache.get(key)
+        if found is not None:
+            return found
+        with self.lock:
+            flight = self.flights.get(domain)
+            leader = flight is None
+            if leader:
+                flight = self.flights[domain] = Flight()
+        if not leader:
+            flight.done.wait(TIMEOUT * 2)
+            return flight.found
+        try:
+            flight.found, timeout = self.lookup(domain)
+            cache.set(key, flight.found, timeout)
+        finally:
+            with self.lock:
+                del self.flights[domain]
+            flight.done.set()
+        return flight.found
+
+
+mx = MX()
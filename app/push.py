@@ -1,27 +1,48 @@
 from json import dumps
 
 from django.core.exceptions import ObjectDoesNotExist
-from emoji import emojize
+from django.db import transaction
 from pywebpush import webpush, WebPushException
 
-from app.models import Push
+from app.models import Outbox
+from app.stream import publish
+from app.utils import utc_timestamp
 from project.settings import VAPID_PRIVATE_KEY
 
 VAPID_CLAIMS = {"sub": "mailto:push@subreply.com"}
+MAX_ATTEMPTS = 5
+TIMEOUT = 10
+CLAIM = 300  # seconds a batch is hidden from other workers, retried if one dies
 
 
 def send_push(user, title, body, url, tag=None):
+    """Wake the user's streams and queue a notification for the push worker."""
+    publish(user.id)
     try:
-        sub = user.push_subscription
+        user.push_subscription
     except ObjectDoesNotExist:
         return
 
-    payload = dumps({
-        "title": title,
-        "body": body,
-        "url": url,
-        "tag": tag or "default",
-    })
+    Outbox.objects.create(
+        user=user,
+        payload={
+            "title": title,
+            "body": body,
+            "url": url,
+            "tag": tag or "default",
+        },
+        created_at=utc_timestamp(),
+        next_at=utc_timestamp(),
+    )
+
+
+def deliver(job):
+    """Deliver a queued notification, reschedule it on failure."""
+    try:
+        sub = job.user.push_subscription
+    except ObjectDoesNotExist:
+        job.delete()
+        return
 
     try:
         webpush(
@@ -32,10 +53,42 @@ def send_push(user, title, body, url, tag=None):
                     "auth": sub.auth,
                 }
             },
-            data=payload,
+            data=dumps(job.payload),
             vapid_private_key=VAPID_PRIVATE_KEY,
             vapid_claims=VAPID_CLAIMS,
+            timeout=TIMEOUT,
         )
     except WebPushException as ex:
-        if ex.response and ex.response.status_code in [410, 404, 429, 503]:
+        if ex.response is not None and ex.response.status_code in [410, 404]:
             sub.delete()
+            job.delete()
+            return
+        retry(job)
+    except Exception:
+        retry(job)
+    else:
+        job.delete()
+
+
+def retry(job):
+    job.attempts += 1
+    if job.attempts >= MAX_ATTEMPTS:
+        job.delete()
+        return
+    job.next_at = utc_timestamp() + 30 * 2 ** job.attempts
+    job.save(update_fields=['attempts', 'next_at'])
+
+
+def drain(limit=100):
+    """Deliver due notifications in a batch, returns the batch size."""
+    now = utc_timestamp()
+    # claim the batch by pushing next_at, so no other worker picks it up
+    with transaction.atomic():
+        ids = list(Outbox.objects.filter(
+            next_at__lte=now
+        ).order_by('id').select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+        Outbox.objects.filter(id__in=ids).update(next_at=now + CLAIM)
+    jobs = list(Outbox.objects.filter(id__in=ids).order_by('id').select_related('user__push_subscription'))
+    for job in jobs:
+        deliver(job)
+    return len(jobs)
@@ -1,39 +1,68 @@
 from pathlib import Path
+from random import choice
 
-from django.db.models import Count, Prefetch, Q, Max
-from emoji import demojize, emojize
-from falcon import HTTPFound, HTTPNotFound, before
+from django.db.models import Prefetch, Q, Max
+from falcon import HTTPFound, HTTPMovedPermanently, HTTPNotFound, before
 from strictyaml import as_document
 
-from app.forms import get_content, get_emoji, get_location, get_metadata, get_name
-from app.hooks import auth_user, login_required
-from app.jinja import render
+from app.directory import PAGE, forget_directory, load_directory, load_sample, posted
+from app.emojis import demojize, emojize
+from app.forms import get_content, get_emoji, get_location, get_name
+from app.hooks import auth_user, forget_user, login_required
+from app.jinja import render, stream
 from app.models import Bond, Chat, Post, Push, Save, User
 from app.push import send_push
+from app.search import search_people, search_posts
+from app.sitemaps import SITEMAPS
+from app.stream import publish
+from app.threads import load_thread
+from app.tokens import Tokens
 from app.utils import build_hash, utc_timestamp, verify_hash
 from app.validation import (authentication, profiling, registration,
                             valid_content, valid_handle, valid_password, valid_phone,
                             valid_reply, valid_thread)
 from project.settings import FERNET, MAX_AGE
 
-Posts = Post.objects.annotate(
-    replies=Count('descendants')
-).select_related('created_by')
+Posts = Post.objects.select_related('created_by')
+KIDS = 5
 
 PPFR = Prefetch('parent', Posts)
-PFR = Prefetch('kids', Posts.order_by('-id'))
-RPFR = Prefetch('kids', Posts.prefetch_related(PFR))
+# newest kids of each entry, sliced prefetch runs as a window function
+PFR = Prefetch('kids', Posts.order_by('-id')[:KIDS], to_attr='children')
 
 
-def paginate(req, qs, limit=16):
+class Cursor:
+    """Id of the last entry when the page is full, read after the entries
+    streamed so the page query isn't run before the first byte."""
+
+    def __init__(self, entries, limit):
+        self.entries = entries
+        self.limit = limit
+
+    def __bool__(self):
+        return len(self.entries) == self.limit
+
+    def __str__(self):
+        return str(self.entries[self.limit - 1].id) if self else ''
+
+
+def paginate(req, qs, limit=16, keyset=False):
+    """Slice a page of qs, keyset lists must be ordered by newest id."""
     p = req.params.get('p', '1').strip()
+    before = req.params.get('before', '').strip()
     if p.isdecimal() and int(p) > 1:
         number = int(p)
     else:
         number = 1
-    page = 'loader' if number > 1 else 'regular'
-    index = (number - 1) * limit
-    return qs[index:index + limit], page, number
+    if keyset and before.isdecimal():
+        page = 'loader'
+        entries = qs.filter(id__lt=int(before))[:limit]
+    else:
+        page = 'loader' if number > 1 else 'regular'
+        index = (number - 1) * limit
+        entries = qs[index:index + limit]
+    cursor = Cursor(entries, limit) if keyset else None
+    return entries, page, number, cursor
 
 
 class MainResource:
@@ -49,9 +78,8 @@ class AboutResource:
     def on_get(self, req, resp):
         luc = User.objects.get(id=1)
         sub = User.objects.get(id=2)
-        emo = User.objects.exclude(
-            id__in=[1, 2]
-        ).exclude(emoji="").order_by("?").first()
+        sample = load_sample()
+        emo = User.objects.filter(id=choice(sample)).first() if sample else None
         resp.text = render(
             page='about', view='about', user=req.user, luc=luc, sub=sub, emo=emo
         )
@@ -76,11 +104,19 @@ class AboutResource:
 
     @before(auth_user)
     def on_get_directory(self, req, resp):
-        users = User.objects.exclude(posts=None).order_by('-id').values_list('emoji', 'username')
-        odds = [u for i, u in enumerate(users) if i % 2 == 1]
-        evens = [u for i, u in enumerate(users) if i % 2 == 0]
-        resp.text = render(
-            page='directory', view='about', user=req.user, users=zip(evens, odds)
+        shards = load_directory()
+        letters = sorted(shards, key=lambda letter: (letter == '#', letter))
+        letter = req.params.get('letter', '').strip()
+        if letter not in shards:
+            letter = letters[0] if letters else ''
+        p = req.params.get('p', '1').strip()
+        number = int(p) if p.isdecimal() and int(p) > 1 else 1
+        index = (number - 1) * PAGE
+        members = shards.get(letter, [])
+        resp.stream = stream(
+            page='directory', view='about', user=req.user,
+            users=members[index:index + PAGE], letters=letters, letter=letter,
+            number=number, more=len(members) > index + PAGE
         )
 
 
@@ -97,35 +133,42 @@ class TxtResource:
         lines = (
             "User-agent: *",
             "",
-            "Sitemap: https://subreply.com/sitemap.txt"
+            "Sitemap: https://subreply.com/sitemap.xml"
         )
         resp.text = "\n".join(lines)
 
     def on_get_map(self, req, resp):
-        threads = Post.objects.filter(parent=None).annotate(Count('kids')).exclude(kids__count=0)
-        replies = Post.objects.exclude(parent=None)
-        posts = threads.union(replies).values_list('id')
-        users = User.objects.exclude(posts=None).values_list('username')
-        posts_urls = [f"https://subreply.com/reply/{p}" for p, in posts]
-        user_urls = [f"https://subreply.com/{u}" for u, in users]
-        urls = sorted(posts_urls + user_urls)
-        resp.text = "\n".join(urls)
+        raise HTTPMovedPermanently('/sitemap.xml')
+
+    def on_get_index(self, req, resp):
+        self.serve(resp, SITEMAPS / 'sitemap.xml', 'application/xml')
+
+    def on_get_shard(self, req, resp, name):
+        if not name.endswith('.txt.gz'):
+            raise HTTPNotFound
+        self.serve(resp, SITEMAPS / f"sitemap-{name}", 'application/gzip')
+
+    def serve(self, resp, path, content_type):
+        """Files written by the sitemap command, nginx serves them in production."""
+        if not path.is_file():
+            raise HTTPNotFound
+        resp.content_type = content_type
+        resp.data = path.read_bytes()
 
 
 class FeedResource:
     placeholder = "What are you up to?"
 
     def fetch_entries(self, user):
-        friends = Bond.objects.filter(created_by=user).values('to_user_id')
-        entries = Posts.filter(created_by__in=friends).order_by('-id')
+        entries = Posts.filter(feeds__user=user).order_by('-id')
         return entries.prefetch_related(PFR, PPFR)
 
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user))
-        resp.text = render(
-            page=page, view='feed', number=number, content='',
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
+        resp.stream = stream(
+            page=page, view='feed', number=number, cursor=cursor, content='',
             user=req.user, entries=entries, errors={},
             placeholder=self.placeholder
         )
@@ -137,8 +180,9 @@ class FeedResource:
         content = get_content(form)
         if not content:
             raise HTTPFound('/')
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
             errors['content'] = valid_thread(content)
         errors = {k: v for k, v in errors.items() if v}
@@ -150,17 +194,18 @@ class FeedResource:
                 placeholder=self.placeholder
             )
         else:
-            hashtags, links, mentions = get_metadata(content)
-            th = Post.objects.create(
+            th = Post(
                 content=content,
                 created_by=req.user,
                 created_at=utc_timestamp(),
-                link=links[0] if links else '',
-                hashtag=hashtags[0] if hashtags else '',
-                at_user=User.objects.filter(
-                    username=mentions[0]
-                ).first() if mentions else None,
+                link=tokens.link,
+                hashtag=tokens.hashtag,
+                at_user=tokens.at_user,
             )
+            th.set_html(tokens)
+            th.save()
+            posted(req.user)
+            th.fan_out()
             if th.at_user and th.at_user != req.user:
                 send_push(
                     th.at_user,
@@ -173,28 +218,18 @@ class FeedResource:
 
 
 class ReplyResource:
-    def fetch_entries(self, parent):
-        return Posts.filter(parent=parent).order_by('-id').prefetch_related(RPFR)
-
-    def fetch_ancestors(self, parent):
-        return Posts.filter(
-            id__in=parent.ancestors.values('id')
-        ).order_by('id').prefetch_related(PPFR)
-
     @before(auth_user)
     def on_get(self, req, resp, id):
-        parent = Posts.filter(id=id).first()
-        if not parent:
+        before = req.params.get('before', '').strip()
+        thread = load_thread(Posts, id, int(before) if before.isdecimal() else None, req.user)
+        if not thread:
             raise HTTPNotFound
-        duplicate = Post.objects.filter(
-            parent=parent, created_by=req.user
-        ).exists() if req.user else True
-        ancestors = self.fetch_ancestors(parent)
-        entries = self.fetch_entries(parent)
-        resp.text = render(
+        parent, ancestors, entries, cursor, replied = thread
+        duplicate = replied if req.user else True
+        resp.stream = stream(
             page='reply', view='reply', content='',
             user=req.user, entry=parent, errors={}, entries=entries,
-            ancestors=ancestors, duplicate=duplicate
+            ancestors=ancestors, duplicate=duplicate, cursor=cursor
         )
 
     @before(auth_user)
@@ -207,36 +242,40 @@ class ReplyResource:
         content = get_content(form)
         if not content:
             raise HTTPFound(f"/reply/{id}")
-        hashtags, links, mentions = get_metadata(content)
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
-            errors['content'] = valid_reply(parent, req.user, content, mentions)
+            errors['content'] = valid_reply(parent, req.user, content, tokens.mentions)
         errors = {k: v for k, v in errors.items() if v}
         if errors:
-            ancestors = self.fetch_ancestors(parent)
-            entries = self.fetch_entries(parent)
+            thread = load_thread(Posts, id)
+            if not thread:
+                raise HTTPNotFound
+            _, ancestors, entries, cursor, _ = thread
             resp.text = render(
                 page='reply', view='reply', content=content,
-                user=req.user, entry=parent, errors=errors,
-                entries=entries, ancestors=ancestors, duplicate=False
+                user=req.user, entry=parent, errors=errors, entries=entries,
+                ancestors=ancestors, duplicate=False, cursor=cursor
             )
         else:
             if existing := Posts.filter(parent=parent, created_by=req.user).first():
                 raise HTTPFound(f"/reply/{existing.id}")
-            re = Post.objects.create(
+            re = Post(
                 parent=parent,
                 created_by=req.user,
                 to_user=parent.created_by,
                 content=content,
                 created_at=utc_timestamp(),
-                link=links[0] if links else '',
-                hashtag=hashtags[0] if hashtags else '',
-                at_user=User.objects.filter(
-                    username=mentions[0]
-                ).first() if mentions else None,
+                link=tokens.link,
+                hashtag=tokens.hashtag,
+                at_user=tokens.at_user,
             )
+            re.set_html(tokens)
+            re.save()
+            posted(req.user)
             re.set_ancestors()
+            re.fan_out()
             if parent.created_by != req.user:
                 send_push(
                     parent.created_by,
@@ -261,7 +300,7 @@ class EditResource:
     @before(login_required)
     def on_get(self, req, resp, id):
         entry = Posts.filter(id=id).prefetch_related(PPFR).first()
-        if not entry or entry.created_by != req.user or entry.replies:
+        if not entry or entry.created_by != req.user or entry.descendant_count:
             raise HTTPNotFound
         ancestors = [entry.parent] if entry.parent_id else []
         resp.text = render(
@@ -273,16 +312,16 @@ class EditResource:
     @before(login_required)
     def on_post(self, req, resp, id):
         entry = Posts.filter(id=id).prefetch_related(PPFR).first()
-        if not entry or entry.created_by != req.user or entry.replies:
+        if not entry or entry.created_by != req.user or entry.descendant_count:
             raise HTTPNotFound
         form = req.get_media()
         content = get_content(form)
-        hashtags, links, mentions = get_metadata(content)
+        tokens = Tokens(content)
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(tokens, req.user)
         if not errors['content']:
             if entry.parent_id:
-                errors['content'] = valid_reply(entry.parent, req.user, content, mentions)
+                errors['content'] = valid_reply(entry.parent, req.user, content, tokens.mentions)
             else:
                 errors['content'] = valid_thread(content)
         errors = {k: v for k, v in errors.items() if v}
@@ -296,13 +335,12 @@ class EditResource:
             previous_at_user = entry.at_user
             entry.content = content
             entry.edited_at = utc_timestamp()
-            entry.link = links[0] if links else ''
-            entry.hashtag = hashtags[0] if hashtags else ''
-            entry.at_user = User.objects.filter(
-                username=mentions[0]
-            ).first() if mentions else None
+            entry.link = tokens.link
+            entry.hashtag = tokens.hashtag
+            entry.at_user = tokens.at_user
             if previous_at_user != entry.at_user:
                 entry.mention_seen_at = .0
+            entry.set_html(tokens)
             entry.save()
             raise HTTPFound(f"/reply/{entry.id}")
 
@@ -322,9 +360,9 @@ class MemberResource:
             is_followed = Bond.objects.filter(created_by=member, to_user=req.user).exists()
         else:
             is_followed = None
-        entries, page, number = paginate(req, self.fetch_entries(member))
-        resp.text = render(
-            page=page, view='member', number=number, errors={},
+        entries, page, number, cursor = paginate(req, self.fetch_entries(member), keyset=True)
+        resp.stream = stream(
+            page=page, view='member', number=number, cursor=cursor, errors={},
             user=req.user, member=member, entries=entries, is_followed=is_followed
         )
 
@@ -337,9 +375,9 @@ class FollowingResource:
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user), 24)
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), 24, keyset=True)
         resp.text = render(
-            page=page, view='following', number=number,
+            page=page, view='following', number=number, cursor=cursor,
             user=req.user, entries=entries, limit=24
         )
 
@@ -350,16 +388,18 @@ class FollowersResource:
         return entries.order_by('-id').select_related('created_by')
 
     def clear_followers(self, user):
-        Bond.objects.filter(
+        cleared = Bond.objects.filter(
             to_user=user, seen_at=.0
         ).update(seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user), 24)
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), 24, keyset=True)
         resp.text = render(
-            page=page, view='followers', number=number,
+            page=page, view='followers', number=number, cursor=cursor,
             user=req.user, entries=entries, limit=24
         )
         if req.user.notif_followers:
@@ -372,16 +412,18 @@ class MentionsResource:
         return entries.prefetch_related(PFR, PPFR)
 
     def clear_mentions(self, user):
-        Post.objects.filter(
+        cleared = Post.objects.filter(
             at_user=user, mention_seen_at=.0
         ).update(mention_seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user))
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.text = render(
-            page=page, view='mentions', number=number,
+            page=page, view='mentions', number=number, cursor=cursor,
             user=req.user, entries=entries
         )
         if req.user.notif_mentions:
@@ -394,16 +436,18 @@ class RepliesResource:
         return entries.prefetch_related(PPFR)
 
     def clear_replies(self, user):
-        Post.objects.filter(
+        cleared = Post.objects.filter(
             to_user=user, reply_seen_at=.0
         ).update(reply_seen_at=utc_timestamp())
+        if cleared:
+            publish(user.id)
 
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user))
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.text = render(
-            page=page, view='replies', number=number,
+            page=page, view='replies', number=number, cursor=cursor,
             user=req.user, entries=entries
         )
         if req.user.notif_replies:
@@ -419,9 +463,9 @@ class SavedResource:
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req.user))
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req.user), keyset=True)
         resp.text = render(
-            page=page, view='saved', number=number,
+            page=page, view='saved', number=number, cursor=cursor,
             user=req.user, entries=entries
         )
 
@@ -432,41 +476,28 @@ class DestroyResource:
     def on_get(self, req, resp, username):
         if not req.user.id == 1:
             raise HTTPFound('/people')
-        username = username.lower()
-        User.objects.filter(username=username).delete()
+        member = User.objects.filter(username=username.lower()).first()
+        if member:
+            forget_user(member)
+            member.delete()
+            forget_directory()
         raise HTTPFound('/people')
 
 
 class PeopleResource:
-    fields = [
-        "username", "first_name", "last_name", "email",
-        "description", "birthday", "location", "emoji", "link"
-    ]
     placeholder = "Find people"
 
-    def build_query(self, terms):
-        query = Q()
-        for term in terms:
-            subquery = Q()
-            for field in self.fields:
-                icontains = {f'{field}__icontains': term}
-                subquery |= Q(**icontains)
-            query &= subquery
-        return query
-
     def fetch_entries(self, terms):
-        q = self.build_query(terms)
-        qs = User.objects.filter(q)
-        return qs.order_by('-seen_at')
+        return search_people(User.objects.all(), terms)
 
     @before(auth_user)
     def on_get(self, req, resp):
         q = demojize(req.params.get('q', '').strip())
         terms = [t.strip() for t in q.split() if t.strip()]
         entries = self.fetch_entries(terms)
-        entries, page, number = paginate(req, entries, 24)
+        entries, page, number, cursor = paginate(req, entries, 24)
         resp.text = render(
-            page=page, view='people', number=number, q=q,
+            page=page, view='people', number=number, cursor=cursor, q=q,
             user=req.user, entries=entries, errors={}, limit=24,
             placeholder=self.placeholder
         )
@@ -475,27 +506,21 @@ class PeopleResource:
 class DiscoverResource:
     placeholder = "Search content"
 
-    def build_query(self, terms):
-        query = Q()
-        for term in terms:
-            query &= Q(content__icontains=term)
-        return query
-
     def fetch_entries(self, terms):
         if terms:
-            f = self.build_query(terms)
+            entries = search_posts(Posts, terms)
         else:
             last_ids = User.objects.annotate(last_id=Max('posts')).values('last_id')
-            f = Q(id__in=last_ids)
-        return Posts.filter(f).order_by('-id').prefetch_related(PFR, PPFR)
+            entries = Posts.filter(id__in=last_ids).order_by('-id')
+        return entries.prefetch_related(PFR, PPFR)
 
     @before(auth_user)
     def on_get(self, req, resp):
         q = demojize(req.params.get('q', '').strip())
         terms = [t.strip() for t in q.split() if t.strip()]
-        entries, page, number = paginate(req, self.fetch_entries(terms))
-        resp.text = render(
-            page=page, view='discover', number=number, q=q,
+        entries, page, number, cursor = paginate(req, self.fetch_entries(terms), keyset=not terms)
+        resp.stream = stream(
+            page=page, view='discover', number=number, cursor=cursor, q=q,
             user=req.user, entries=entries, errors={},
             placeholder=self.placeholder
         )
@@ -505,15 +530,15 @@ class TrendingResource:
     limit = 24
 
     def fetch_entries(self):
-        sample = Post.objects.filter(parent=None).exclude(kids=None).order_by('-id').values('id')[:self.limit]
-        entries = Posts.filter(id__in=sample).order_by('-replies', '-id')
+        sample = Post.objects.filter(parent=None, kid_count__gt=0).order_by('-id').values('id')[:self.limit]
+        entries = Posts.filter(id__in=sample).order_by('-descendant_count', '-id')
         return entries.prefetch_related(PFR)
 
     @before(auth_user)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries())
+        entries, page, number, cursor = paginate(req, self.fetch_entries())
         resp.text = render(
-            page=page, view='trending', number=number,
+            page=page, view='trending', number=number, cursor=cursor,
             user=req.user, entries=entries
         )
 
@@ -529,9 +554,9 @@ class MessagesResource:
     @before(auth_user)
     @before(login_required)
     def on_get(self, req, resp):
-        entries, page, number = paginate(req, self.fetch_entries(req))
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req), keyset=True)
         resp.text = render(
-            page=page, view='messages', number=number,
+            page=page, view='messages', number=number, cursor=cursor,
             user=req.user, entries=entries
         )
 
@@ -544,9 +569,11 @@ class MessageResource:
         return entries.select_related('created_by', 'to_user')
 
     def clear_messages(self, req, member):
-        Chat.objects.filter(
+        cleared = Chat.objects.filter(
             created_by=member, to_user=req.user, seen_at=.0
         ).update(seen_at=utc_timestamp())
+        if cleared:
+            publish(req.user.id)
 
     @before(auth_user)
     @before(login_required)
@@ -555,12 +582,12 @@ class MessageResource:
         member = User.objects.filter(username=username).first()
         if not member:
             raise HTTPNotFound
-        entries, page, number = paginate(req, self.fetch_entries(req, member))
+        entries, page, number, cursor = paginate(req, self.fetch_entries(req, member), keyset=True)
         forward = Chat.objects.filter(created_by=req.user, to_user=member).exists()
         backward = Chat.objects.filter(created_by=member, to_user=req.user).exists()
         blocked = True if forward and not backward else False
         resp.text = render(
-            page=page, view='message', number=number, user=req.user, errors={},
+            page=page, view='message', number=number, cursor=cursor, user=req.user, errors={},
             entries=entries, member=member, blocked=blocked
         )
         self.clear_messages(req, member)
@@ -577,12 +604,12 @@ class MessageResource:
         if not content:
             raise HTTPFound(f"/{username}/message")
         errors = {}
-        errors['content'] = valid_content(content, req.user)
+        errors['content'] = valid_content(Tokens(content), req.user)
         errors = {k: v for k, v in errors.items() if v}
         if errors:
-            entries, page, number = paginate(req, self.fetch_entries(req, member))
+            entries, page, number, cursor = paginate(req, self.fetch_entries(req, member), keyset=True)
             resp.text = render(
-                page=page, view='message', number=number, user=req.user,
+                page=page, view='message', number=number, cursor=cursor, user=req.user,
                 member=member, entries=entries, content=content, errors=errors
             )
         else:
@@ -629,7 +656,8 @@ class AccountResource:
             )
         else:
             req.user.password = build_hash(password1)
-            req.user.save()
+            req.user.save(update_fields=['password'])
+            forget_user(req.user)
             resp.unset_cookie('identity')
             raise HTTPFound('/login')
 
@@ -682,7 +710,9 @@ class AccountResource:
                 delete_errors=errors, form=form
             )
         else:
+            forget_user(req.user)
             req.user.delete()
+            forget_directory()
             resp.unset_cookie('identity')
             raise HTTPFound('/discover')
 
@@ -728,6 +758,7 @@ class DetailsResource:
             req.user.phone = p
             req.user.social = s
             req.user.save(update_fields=['phone', 'social'])
+            forget_user(req.user)
             raise HTTPFound(f"/{req.user}")
 
 
@@ -760,10 +791,15 @@ class ProfileResource:
                 errors=errors, form=form
             )
         else:
-            for field, value in f.items():
-                if getattr(req.user, field, '') != value:
-                    setattr(req.user, field, value)
-            req.user.save()
+            # req.user is a cached snapshot, diff and rebuild search on the fresh row
+            req.user = User.objects.get(id=req.user.id)
+            changed = [field for field, value in f.items() if getattr(req.user, field, '') != value]
+            for field in changed:
+                setattr(req.user, field, f[field])
+            req.user.set_search()
+            req.user.save(update_fields=changed + ['search'])
+            forget_user(req.user)
+            forget_directory()
             raise HTTPFound('/{0}'.format(req.user))
 
 
@@ -836,6 +872,9 @@ class RegisterResource:
                 birthday=f['birthday'],
                 location=f['location'],
             )
+            user.set_search()
+            user.save(update_fields=['search'])
+            forget_directory()
             # create self bond
             Bond.objects.create(
                 created_by=user,
@@ -0,0 +1,63 @@
+from re import findall
+from string import ascii_letters, digits
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from unidecode import unidecode
+
+# must match the expression of post_content_search index
+VECTOR = SearchVector('content', config='simple')
+
+
+def is_hashtag(term):
+    handle = term[1:]
+    if term.startswith('#') and handle and not handle.isdecimal():
+        return all(c in digits + ascii_letters for c in handle)
+    return False
+
+
+def search_posts(qs, terms):
+    """Search posts by hashtag and content, ranked on PostgreSQL."""
+    words = []
+    for term in terms:
+        if is_hashtag(term):
+            tag = term[1:].lower()
+            # posts from before the hashtag column only have it in content
+            older = Q(content__icontains=term)
+            if connection.vendor == 'postgresql':
+                # the content index narrows them down, icontains rechecks the #
+                qs = qs.alias(tags=VECTOR)
+                older &= Q(tags=SearchQuery(tag, config='simple'))
+            qs = qs.filter(Q(hashtag=tag) | older)
+        else:
+            words.append(term)
+    if not words:
+        return qs.order_by('-id')
+    # letters and digits of any script, like the words in the index vector
+    lexemes = [lexeme for word in words for lexeme in findall(r'[^\W_]+', word.lower())]
+    if connection.vendor != 'postgresql' or not lexemes:
+        for word in words:
+            qs = qs.filter(content__icontains=word)
+        return qs.order_by('-id')
+    query = SearchQuery(
+        " & ".join(f"{lexeme}:*" for lexeme in lexemes),
+        config='simple', search_type='raw'
+    )
+    return qs.alias(search=VECTOR).filter(search=query).annotate(
+        rank=SearchRank(VECTOR, query)
+    ).order_by('-rank', '-id')
+
+
+def search_people(qs, terms):
+    """Search people by their document, best matches first."""
+    rank = Value(0)
+    for term in terms:
+        term = unidecode(term.lower())
+        qs = qs.filter(search__contains=term)
+        rank += Case(
+            When(username__startswith=term, then=2),
+            When(search__contains=f" {term}", then=1),
+            default=0, output_field=IntegerField()
+        )
+    return qs.annotate(rank=rank).order_by('-rank', '-seen_at')
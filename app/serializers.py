@@ -1,4 +1,4 @@
-from emoji import emojize
+from app.emojis import emojize
 from app.filters import timeago
 from app.utils import utc_timestamp
 
@@ -23,15 +23,17 @@ def build_user(user):
 def build_entry(entry, saves, has_parent=False, has_kids=False):
     data = {
         "id": entry.id,
-        "content": emojize(entry.content),
+        "content": entry.emojized,
         "created_by": build_user(entry.created_by),
         "saved": entry.id in saves,
+        "replies": entry.descendant_count,
         "timestamp": timeago(utc_timestamp() - entry.created_at)
     }
     if has_parent:
         data['parent'] = build_entry(entry.parent, saves) if entry.parent else None
     if has_kids:
-        data['kids'] = [build_entry(kid, saves) for kid in entry.kids.all()]
+        data['kids'] = [build_entry(kid, saves) for kid in entry.children]
+        data['more'] = max(entry.kid_count - len(entry.children), 0)
     return data
 
 
@@ -0,0 +1,29 @@
+import gzip
+from datetime import datetime, timezone
+from pathlib import Path
+
+SITEMAPS = Path(__file__).parent.parent / "sitemaps"
+BASE = "https://subreply.com"
+SIZE = 50000  # urls per shard, the protocol limit
+
+
+def write_shard(name, urls):
+    """Gzip urls one per line, swapped in whole so it's never served half written."""
+    path = SITEMAPS / name
+    temp = path.with_suffix('.tmp')
+    with gzip.GzipFile(temp, 'wb', mtime=0) as file:
+        for url in urls:
+            file.write(f"{url}\n".encode())
+    temp.replace(path)
+
+
+def write_index(names):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>']
+    lines.append('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">')
+    for name in names:
+        modified = datetime.fromtimestamp((SITEMAPS / name).stat().st_mtime, tz=timezone.utc)
+        lines.append(f"<sitemap><loc>{BASE}/{name}</loc><lastmod>{modified.date()}</lastmod></sitemap>")
+    lines.append('</sitemapindex>')
+    temp = SITEMAPS / 'sitemap.tmp'
+    temp.write_text("\n".join(lines))
+    temp.replace(SITEMAPS / 'sitemap.xml')
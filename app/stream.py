@@ -0,0 +1,155 @@
+from json import dumps
+from queue import Empty, Queue
+from select import select
+from threading import Lock, Thread
+from time import sleep
+
+from django.db import connection
+
+from app.models import Chat
+from app.serializers import build_chat
+from project.settings import LISTEN_PORT
+
+CHANNEL = 'stream'
+PING = 15  # seconds between keep-alive comments
+COUNTS = {
+    'notif_followers': 'followers',
+    'notif_mentions': 'mentions',
+    'notif_replies': 'replies',
+    'notif_messages': 'messages',
+}
+
+
+class Hub:
+    """In-process pub/sub, wakes the streams of a user."""
+
+    def __init__(self):
+        self.queues = {}  # user id: set of queues
+        self.lock = Lock()
+
+    def subscribe(self, user_id):
+        queue = Queue()
+        with self.lock:
+            self.queues.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            queues = self.queues.get(user_id, set())
+            queues.discard(queue)
+            if not queues:
+                self.queues.pop(user_id, None)
+
+    def dispatch(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                queues = [q for qs in self.queues.values() for q in qs]
+            else:
+                queues = list(self.queues.get(user_id, ()))
+        for queue in queues:
+            queue.put(True)
+
+    def publish(self, user_id):
+        self.dispatch(user_id)
+
+
+class PostgresHub(Hub):
+    """Pub/sub across processes with LISTEN/NOTIFY.
+
+    Each process keeps one listening connection straight to PostgreSQL
+    on LISTEN_PORT, pgbouncer in transaction mode would drop the session.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def subscribe(self, user_id):
+        with self.lock:
+            if not self.listener:
+                self.listener = Thread(target=self.listen, daemon=True)
+                self.listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, str(user_id)])
+
+    def listen(self):
+        while True:
+            conn = None
+            try:
+                params = connection.get_connection_params()
+                params['port'] = LISTEN_PORT
+                conn = connection.get_new_connection(params)
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # notifications may have been missed while disconnected
+                self.dispatch()
+                while True:
+                    select([conn], [], [], PING)
+                    conn.poll()
+                    while conn.notifies:
+                        self.dispatch(int(conn.notifies.pop(0).payload))
+            except Exception as e:
+                # the listener must outlive bad payloads and broken sockets
+                print('stream listener:', repr(e))
+                if conn:
+                    conn.close()
+                sleep(1)
+
+
+hub = PostgresHub() if connection.vendor == 'postgresql' else Hub()
+
+
+def publish(user_id):
+    """Wake the streams of a user, they reload counters and messages."""
+    hub.publish(user_id)
+
+
+def message(event, data):
+    return f"event: {event}\ndata: {dumps(data)}\n\n".encode()
+
+
+def fetch_counts(user):
+    return {COUNTS[k]: v for k, v in user.count_notifs().items()}
+
+
+def fetch_chats(user, last_id):
+    return list(Chat.objects.filter(
+        to_user=user, id__gt=last_id
+    ).order_by('id').select_related('created_by', 'to_user'))
+
+
+def events(user):
+    """Server-sent events for a user, counters first then deltas and chats.
+
+    The database connection is closed between wake-ups so an idle stream
+    doesn't hold one.
+    """
+    queue = hub.subscribe(user.id)
+    try:
+        counts = fetch_counts(user)
+        last_id = Chat.objects.filter(to_user=user).order_by('-id').values_list('id', flat=True).first() or 0
+        connection.close()
+        yield message('counts', counts)
+        while True:
+            try:
+                queue.get(timeout=PING)
+            except Empty:
+                yield b": ping\n\n"
+                continue
+            while not queue.empty():
+                queue.get_nowait()
+            fresh = fetch_counts(user)
+            chats = fetch_chats(user, last_id)
+            connection.close()
+            delta = {k: v - counts[k] for k, v in fresh.items() if v != counts[k]}
+            counts = fresh
+            for chat in chats:
+                last_id = chat.id
+                yield message('chat', build_chat(chat))
+            if delta:
+                yield message('delta', delta)
+    finally:
+        hub.unsubscribe(user.id, queue)
@@ -0,0 +1,45 @@
+from django.db.models import Case, F, Q, Value, When, Window
+from django.db.models.functions import Rank
+
+
+def load_thread(qs, id, before=None, user=None, limit=16, cap=5):
+    """Post with ancestors and a page of replies in two queries.
+
+    Replies come newest first, older than before when given, each holding
+    at most cap of its own newest replies in children. Returns None or the
+    post, its ancestors from the top, the replies, the next cursor and
+    whether user replied to the post.
+    """
+    parent = qs.filter(id=id).first()
+    if not parent:
+        return None
+    ancestor_ids = set(parent.ancestor_ids)
+    page = qs.filter(parent_id=id)
+    if before:
+        page = page.filter(id__lt=before)
+    page = page.order_by('-id').values('id')[:limit]
+    found = Q(id__in=ancestor_ids) | Q(id__in=page) | Q(parent_id__in=page)
+    if user:
+        found |= Q(parent_id=id, created_by=user)
+    # replies tie at rank 1, their own replies rank newest first
+    rank = Window(Rank(), partition_by=F('parent_id'), order_by=Case(
+        When(parent_id=id, then=Value(0)), default=-F('id')
+    ))
+    posts = list(qs.annotate(rank=rank).filter(found, rank__lte=cap).order_by('-id'))
+    ancestors = []
+    nodes = {}
+    for post in [parent, *posts]:
+        post.children = []
+        nodes[post.id] = post
+    # newest first, replies get children in the same order
+    for post in posts:
+        if post.id in ancestor_ids:
+            ancestors.insert(0, post)
+        else:
+            post.parent = nodes[post.parent_id]
+            post.parent.children.append(post)
+    replied = any(post.created_by_id == user.id for post in parent.children) if user else False
+    # the user's own reply may sit outside the page
+    kids = [post for post in parent.children if not before or post.id < before][:limit]
+    cursor = kids[-1].id if len(kids) == limit else None
+    return parent, ancestors, kids, cursor, replied
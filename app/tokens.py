@@ -0,0 +1,83 @@
+from string import ascii_letters, digits
+
+DIGITS = frozenset(digits)
+HASHTAG = frozenset(digits + ascii_letters)
+HANDLE = frozenset(digits + ascii_letters + "_")
+
+
+def escape(text):
+    """Unicode xml safe."""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def unwrap(word):
+    """Split punctuation around a word."""
+    endswith = ""
+    startswith = ""
+    if word.endswith(('...', '!!!', '???')):
+        endswith = word[-3:]
+        word = word[:-3]
+    if word.endswith(('..', '!!', '??')):
+        endswith = word[-2:]
+        word = word[:-2]
+    if word.endswith(('.', ',', '!', '?', ':', ';')):
+        endswith = word[-1:]
+        word = word[:-1]
+    if word.endswith((')', ']', '}', "'", '"')):
+        endswith = word[-1:] + endswith
+        word = word[:-1]
+    if word.startswith(('(', '[', '{', "'", '"')):
+        startswith = word[:1]
+        word = word[1:]
+    if word.endswith("'s"):
+        endswith = word[-2:] + endswith
+        word = word[:-2]
+    return startswith, word, endswith
+
+
+class Tokens:
+    """Hashtags, links, mentions and HTML of a text in a single scan."""
+
+    def __init__(self, text):
+        self.text = text
+        self.hashtags, self.links, self.mentions = [], [], []
+        self.at_user = None  # mentioned member, resolved by valid_content
+        words = []
+        for word in text.split():
+            startswith, word, endswith = unwrap(word)
+            html = escape(word)
+            if word.startswith(('http://', 'https://')):
+                protocol, separator, address = word.partition('://')
+                if "." in address:
+                    self.links.append(word.lower())
+                if address.startswith('www.'):
+                    address = address[4:]
+                if address.endswith('/'):
+                    address = address[:-1]
+                if len(address) > 21:
+                    address = address[:18] + '...'
+                if address:
+                    safe_url = html.replace('"', '&quot;').replace("'", '&#x27;')
+                    html = f'<a href="{safe_url}" rel="external">{escape(address)}</a>'
+            elif word.startswith('@'):
+                handle = word[1:]
+                if handle and HANDLE.issuperset(handle):
+                    self.mentions.append(handle.lower())
+                    html = f'<a href="/{handle}" rel="author">@{handle}</a>'
+            elif word.startswith('#'):
+                handle = word[1:]
+                if handle and DIGITS.issuperset(handle):
+                    html = f'<a href="/reply/{handle}" rel="bookmark">#{handle}</a>'
+                elif handle and HASHTAG.issuperset(handle):
+                    self.hashtags.append(handle.lower())
+                    html = f'<a href="/discover?q=%23{handle}" rel="tag">#{handle}</a>'
+            words.append(escape(startswith) + html + escape(endswith))
+        self.html = " ".join(words)
+
+    @property
+    def hashtag(self):
+        return self.hashtags[0] if self.hashtags else ''
+
+    @property
+    def link(self):
+        return self.links[0] if self.links else ''
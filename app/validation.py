@@ -2,14 +2,14 @@ from datetime import date
 from string import ascii_letters, digits
 
 from django.db.models import Q
-from dns.resolver import resolve as dns_query
-from emoji import EMOJI_DATA, emoji_count
 from phonenumbers import is_possible_number, is_valid_number, parse
 
-from app.forms import get_metadata
+from app.emojis import CODES, has_emoji
 from app.models import Post, User
+from app.mx import mx
+from app.tokens import Tokens
 from app.utils import has_repetitions, verify_hash
-from project.vars import INVALID, MIN_AGE, MAX_AGE, CITIES, LATIN
+from project.vars import INVALID, MIN_AGE, MAX_AGE, LATIN, LOCATIONS
 
 
 def valid_hashtag(value):
@@ -26,8 +26,12 @@ def valid_hashtag(value):
         return "Hashtag contains repeating characters"
 
 
-def valid_content(value, user, limit=640):
-    hashtags, links, mentions = get_metadata(value)
+def valid_content(tokens, user, limit=640):
+    """Validate tokenized content, resolves the mentioned member into at_user."""
+    value = tokens.text
+    hashtags, links, mentions = tokens.hashtags, tokens.links, tokens.mentions
+    if mentions:
+        tokens.at_user = User.objects.filter(username=mentions[0]).first()
     if not value:
         return "Share something"
     elif len(value) > limit:
@@ -59,7 +63,7 @@ def valid_content(value, user, limit=640):
             return "Don't mention yourself"
         elif mention == value.lower()[1:]:
             return "Share more than a mention"
-        elif not User.objects.filter(username=mention).exists():
+        elif not tokens.at_user:
             return "@{0} account doesn't exist".format(mention)
 
 
@@ -77,10 +81,12 @@ def valid_thread(value):
 
 def valid_reply(parent, user, value, mentions):
     """Duplicate reply against replies for topic including topic."""
-    ancestors = parent.ancestors.values_list('id', flat=True)
-    top_id = min(ancestors) if ancestors else parent.id
+    # the reply's path is the parent's path and id, it has to fit the column
+    if len(f"{parent.path}{parent.id}/") > Post._meta.get_field('path').max_length:
+        return "Thread is too deep to reply"
+    top_id = parent.root_id or parent.id
     duplicate = Post.objects.filter(
-        (Q(ancestors=top_id) | Q(id=top_id)) & Q(content__iexact=value)
+        (Q(root=top_id) | Q(id=top_id)) & Q(content__iexact=value)
     ).select_related('created_by').first()
     if duplicate:
         err = 'Duplicate of #{0} by @{1}'
@@ -138,7 +144,7 @@ def valid_first_name(value):
         return "First name is just too short"
     elif len(value) > 15:
         return "First name can't be longer than 15 characters"
-    elif emoji_count(value):
+    elif has_emoji(value):
         return "First name contains emoji"
     elif has_repetitions(value):
         return "First name contains repeating characters"
@@ -149,7 +155,7 @@ def valid_first_name(value):
 def valid_last_name(value):
     if len(value) > 15:
         return "Last name can't be longer than 15 characters"
-    elif emoji_count(value):
+    elif has_emoji(value):
         return "Last name contains emoji"
     elif value and has_repetitions(value):
         return "Last name contains repeating characters"
@@ -179,18 +185,14 @@ def valid_email(value, user_id=0):
         return "Email is used by someone else"
     else:
         handle, domain = value.split('@', 1)
-        try:
-            has_mx = bool(dns_query(domain, 'MX'))
-        except Exception:
-            has_mx = False
-        if not has_mx:
+        if not mx.check(domain):
             return "Email can't be sent to this address"
 
 
 def valid_description(value, user_id=0):
     if value:
         user = User.objects.filter(id=user_id).first()
-        return valid_content(value, user)
+        return valid_content(Tokens(value), user)
 
 
 def valid_link(value, user_id=0):
@@ -262,17 +264,16 @@ def valid_location(value, delimiter=", "):
             return "City, Country or just Country"
         elif value.count(delimiter):
             city, country = value.split(delimiter)
-            if country not in CITIES:
+            if country not in LOCATIONS:
                 return "Country is invalid"
-            elif city not in CITIES[country]:
+            elif value not in LOCATIONS:
                 return "City is invalid"
-        elif value not in CITIES:
+        elif value not in LOCATIONS:
             return "Country is invalid"
 
 
 def valid_emoji(value):
-    codes = [v['en'] for v in EMOJI_DATA.values()]
-    if value and value not in codes:
+    if value and value not in CODES:
         return "Emoji is invalid"
 
 
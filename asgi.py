@@ -0,0 +1,77 @@
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from falcon import asgi
+from falcon.constants import MEDIA_HTML
+from falcon.errors import MediaNotFoundError
+
+from main import build
+
+THREADS = 8  # per process, each thread keeps its own database connection
+POOL = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='orm')
+# server-sent events wait on their queues between wake-ups, away from the pool
+STREAMS = ThreadPoolExecutor(max_workers=256, thread_name_prefix='sse')
+
+
+async def run(func, *args, **kwargs):
+    """Run blocking code, ORM calls included, on the bounded pool."""
+    return await get_running_loop().run_in_executor(POOL, partial(func, *args, **kwargs))
+
+
+async def iterate(stream, pool=POOL):
+    loop, done = get_running_loop(), object()
+    try:
+        while (chunk := await loop.run_in_executor(pool, next, stream, done)) is not done:
+            yield chunk
+    finally:
+        pool.submit(stream.close)
+
+
+class Request(asgi.Request):
+    """Reads the body upfront so responders get media synchronously."""
+
+    media_value = None
+    media_error = None
+
+    async def read_media(self):
+        try:
+            self.media_value = await super().get_media()
+        except Exception as ex:
+            self.media_error = ex
+
+    def get_media(self, default_when_empty=None):
+        if isinstance(self.media_error, MediaNotFoundError) and default_when_empty is not None:
+            return default_when_empty
+        if self.media_error:
+            raise self.media_error
+        return self.media_value
+
+
+def threaded(responder):
+    async def on_request(req, resp, **params):
+        await req.read_media()
+        await run(responder, req, resp, **params)
+        if hasattr(resp.stream, '__next__'):
+            events = resp.content_type == 'text/event-stream'
+            resp.stream = iterate(resp.stream, STREAMS if events else POOL)
+    return on_request
+
+
+class Threaded:
+    """Async responders for a sync resource, hooks run in the pool too."""
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    def __getattr__(self, name):
+        attr = getattr(self.resource, name)
+        return threaded(attr) if name.startswith('on_') else attr
+
+
+class App(asgi.App):
+    def add_route(self, uri_template, resource, **kwargs):
+        super().add_route(uri_template, Threaded(resource), **kwargs)
+
+
+app = build(App(media_type=MEDIA_HTML, request_type=Request))
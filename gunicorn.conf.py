@@ -4,3 +4,10 @@ bind = "127.0.0.1:8000" if DEBUG else "unix:sub.socket"
 pidfile = "sub.pid"
 workers = 1 if DEBUG else 3
 reload = DEBUG
+preload_app = not DEBUG
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from app.jinja import warmup
+        warmup()
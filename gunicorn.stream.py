@@ -0,0 +1,13 @@
+from project.settings import DEBUG
+
+bind = "127.0.0.1:8001" if DEBUG else "unix:stream.socket"
+pidfile = "stream.pid"
+workers = 1 if DEBUG else 2
+worker_class = "gevent"
+worker_connections = 1000
+reload = DEBUG
+
+
+def post_fork(server, worker):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
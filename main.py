@@ -6,88 +6,98 @@ from falcon.constants import MEDIA_HTML
 from app import api, resources
 from project.settings import DEBUG
 
-app = App(media_type=MEDIA_HTML)
-app.req_options.strip_url_path_trailing_slash = True
-app.resp_options.secure_cookies_by_default = not DEBUG
-
-app.add_route('/', resources.MainResource())
-
-if DEBUG:
-    app.add_static_route('/static', Path('static').absolute())
-
-# post
-app.add_route('/api/login', api.LoginEndpoint())
-app.add_route('/api/register', api.RegisterEndpoint())
-app.add_route('/api/thread', api.ThreadEndpoint())
-app.add_route('/api/{username}/send', api.SendEndpoint())
-# actions
-app.add_route('/api/unsend/{id:int}', api.UnsendEndpoint())
-app.add_route('/api/{username}/clearout', api.ClearoutEndpoint())
-app.add_route('/api/delete/{id:int}', api.DeleteEndpoint())
-app.add_route('/api/save/{id:int}', api.SaveEndpoint())
-app.add_route('/api/unsave/{id:int}', api.UnsaveEndpoint())
-app.add_route('/api/follow/{username}', api.FollowEndpoint())
-app.add_route('/api/unfollow/{username}', api.UnfollowEndpoint())
-# patch
-app.add_route('/api/edit/{id:int}', api.EditEndpoint())
-app.add_route('/api/profile', api.ProfileEndpoint())
-app.add_route('/api/details', api.DetailsEndpoint())
-# get
-app.add_route('/api/feed', api.FeedEndpoint())
-app.add_route('/api/reply/{id:int}', api.ReplyEndpoint())
-app.add_route('/api/following', api.FollowingEndpoint())
-app.add_route('/api/followers', api.FollowersEndpoint())
-app.add_route('/api/mentions', api.MentionsEndpoint())
-app.add_route('/api/replies', api.RepliesEndpoint())
-app.add_route('/api/saved', api.SavedEndpoint())
-app.add_route('/api/people', api.PeopleEndpoint())
-app.add_route('/api/trending', api.TrendingEndpoint())
-app.add_route('/api/discover', api.DiscoverEndpoint())
-app.add_route('/api/messages', api.MessagesEndpoint())
-app.add_route('/api/{username}/message', api.MessageEndpoint())
-app.add_route('/api/notifications', api.NotificationsEndpoint())
-app.add_route('/api/vapid-key', api.VapidKeyEndpoint())
-app.add_route('/api/push/subscribe', api.PushSubscribeEndpoint())
-app.add_route('/api/push/unsubscribe', api.PushUnsubscribeEndpoint())
-app.add_route('/api/{username}', api.MemberEndpoint())
-
-app.add_route('/feed', resources.FeedResource())
-app.add_route('/following', resources.FollowingResource())
-app.add_route('/followers', resources.FollowersResource())
-app.add_route('/mentions', resources.MentionsResource())
-app.add_route('/messages', resources.MessagesResource())
-app.add_route('/replies', resources.RepliesResource())
-app.add_route('/saved', resources.SavedResource())
-
-app.add_route('/people', resources.PeopleResource())
-app.add_route('/trending', resources.TrendingResource())
-app.add_route('/discover', resources.DiscoverResource())
-
-app.add_route('/about', resources.AboutResource())
-app.add_route('/api', resources.AboutResource(), suffix="api")
-app.add_route('/directory', resources.AboutResource(), suffix="directory")
-app.add_route('/privacy', resources.AboutResource(), suffix="privacy")
-app.add_route('/terms', resources.AboutResource(), suffix="terms")
-
-app.add_route('/sw.js', resources.SwResource())
-app.add_route('/robots.txt', resources.TxtResource(), suffix="bots")
-app.add_route('/sitemap.txt', resources.TxtResource(), suffix="map")
-
-app.add_route('/login', resources.LoginResource())
-app.add_route('/logout', resources.LogoutResource())
-app.add_route('/register', resources.RegisterResource())
-app.add_route('/recover', resources.RecoverResource())
-app.add_route('/recover/{token}', resources.RecoverResource(), suffix="link")
-
-app.add_route('/profile', resources.ProfileResource())
-app.add_route('/details', resources.DetailsResource())
-app.add_route('/account', resources.AccountResource())
-app.add_route('/account/change', resources.AccountResource(), suffix="change")
-app.add_route('/account/delete', resources.AccountResource(), suffix="delete")
-app.add_route('/account/export', resources.AccountResource(), suffix="export")
-
-app.add_route('/reply/{id:int}', resources.ReplyResource())
-app.add_route('/edit/{id:int}', resources.EditResource())
-app.add_route('/{username}/message', resources.MessageResource())
-app.add_route('/{username}/destroy', resources.DestroyResource())
-app.add_route('/{username}', resources.MemberResource())
+
+def build(app):
+    """Routes shared by the WSGI and the ASGI app."""
+    app.req_options.strip_url_path_trailing_slash = True
+    app.resp_options.secure_cookies_by_default = not DEBUG
+
+    app.add_route('/', resources.MainResource())
+
+    if DEBUG:
+        app.add_static_route('/static', Path('static').absolute())
+
+    # post
+    app.add_route('/api/login', api.LoginEndpoint())
+    app.add_route('/api/register', api.RegisterEndpoint())
+    app.add_route('/api/thread', api.ThreadEndpoint())
+    app.add_route('/api/{username}/send', api.SendEndpoint())
+    # actions
+    app.add_route('/api/unsend/{id:int}', api.UnsendEndpoint())
+    app.add_route('/api/{username}/clearout', api.ClearoutEndpoint())
+    app.add_route('/api/delete/{id:int}', api.DeleteEndpoint())
+    app.add_route('/api/save/{id:int}', api.SaveEndpoint())
+    app.add_route('/api/unsave/{id:int}', api.UnsaveEndpoint())
+    app.add_route('/api/follow/{username}', api.FollowEndpoint())
+    app.add_route('/api/unfollow/{username}', api.UnfollowEndpoint())
+    # patch
+    app.add_route('/api/edit/{id:int}', api.EditEndpoint())
+    app.add_route('/api/profile', api.ProfileEndpoint())
+    app.add_route('/api/details', api.DetailsEndpoint())
+    # get
+    app.add_route('/api/feed', api.FeedEndpoint())
+    app.add_route('/api/reply/{id:int}', api.ReplyEndpoint())
+    app.add_route('/api/following', api.FollowingEndpoint())
+    app.add_route('/api/followers', api.FollowersEndpoint())
+    app.add_route('/api/mentions', api.MentionsEndpoint())
+    app.add_route('/api/replies', api.RepliesEndpoint())
+    app.add_route('/api/saved', api.SavedEndpoint())
+    app.add_route('/api/people', api.PeopleEndpoint())
+    app.add_route('/api/locations', api.LocationsEndpoint())
+    app.add_route('/api/trending', api.TrendingEndpoint())
+    app.add_route('/api/discover', api.DiscoverEndpoint())
+    app.add_route('/api/messages', api.MessagesEndpoint())
+    app.add_route('/api/{username}/message', api.MessageEndpoint())
+    app.add_route('/api/notifications', api.NotificationsEndpoint())
+    app.add_route('/api/stream', api.StreamEndpoint())
+    app.add_route('/api/vapid-key', api.VapidKeyEndpoint())
+    app.add_route('/api/push/subscribe', api.PushSubscribeEndpoint())
+    app.add_route('/api/push/unsubscribe', api.PushUnsubscribeEndpoint())
+    app.add_route('/api/{username}', api.MemberEndpoint())
+
+    app.add_route('/feed', resources.FeedResource())
+    app.add_route('/following', resources.FollowingResource())
+    app.add_route('/followers', resources.FollowersResource())
+    app.add_route('/mentions', resources.MentionsResource())
+    app.add_route('/messages', resources.MessagesResource())
+    app.add_route('/replies', resources.RepliesResource())
+    app.add_route('/saved', resources.SavedResource())
+
+    app.add_route('/people', resources.PeopleResource())
+    app.add_route('/trending', resources.TrendingResource())
+    app.add_route('/discover', resources.DiscoverResource())
+
+    app.add_route('/about', resources.AboutResource())
+    app.add_route('/api', resources.AboutResource(), suffix="api")
+    app.add_route('/directory', resources.AboutResource(), suffix="directory")
+    app.add_route('/privacy', resources.AboutResource(), suffix="privacy")
+    app.add_route('/terms', resources.AboutResource(), suffix="terms")
+
+    app.add_route('/sw.js', resources.SwResource())
+    app.add_route('/robots.txt', resources.TxtResource(), suffix="bots")
+    app.add_route('/sitemap.txt', resources.TxtResource(), suffix="map")
+    app.add_route('/sitemap.xml', resources.TxtResource(), suffix="index")
+    app.add_route('/sitemap-{name}', resources.TxtResource(), suffix="shard")
+
+    app.add_route('/login', resources.LoginResource())
+    app.add_route('/logout', resources.LogoutResource())
+    app.add_route('/register', resources.RegisterResource())
+    app.add_route('/recover', resources.RecoverResource())
+    app.add_route('/recover/{token}', resources.RecoverResource(), suffix="link")
+
+    app.add_route('/profile', resources.ProfileResource())
+    app.add_route('/details', resources.DetailsResource())
+    app.add_route('/account', resources.AccountResource())
+    app.add_route('/account/change', resources.AccountResource(), suffix="change")
+    app.add_route('/account/delete', resources.AccountResource(), suffix="delete")
+    app.add_route('/account/export', resources.AccountResource(), suffix="export")
+
+    app.add_route('/reply/{id:int}', resources.ReplyResource())
+    app.add_route('/edit/{id:int}', resources.EditResource())
+    app.add_route('/{username}/message', resources.MessageResource())
+    app.add_route('/{username}/destroy', resources.DestroyResource())
+    app.add_route('/{username}', resources.MemberResource())
+    return app
+
+
+app = build(App(media_type=MEDIA_HTML))
@@ -0,0 +1,4 @@
+DEBUG = False
+SIGNATURE = "6Yx3oOa4lHmQy2bmw6l2Z3Nw6sJ8cX2m3pP5kq9pQxA="
+VAPID_PRIVATE_KEY = ""
+VAPID_PUBLIC_KEY = ""
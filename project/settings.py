@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from cryptography.fernet import Fernet
 
 from project.local import DEBUG, SIGNATURE, VAPID_PRIVATE_KEY, VAPID_PUBLIC_KEY
@@ -24,6 +26,15 @@ DATABASES = {
         "PORT": "6432",
     }
 }
+# LISTEN needs a session, pgbouncer above runs in transaction mode
+LISTEN_PORT = "5432"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": Path(__file__).parent.parent / "cache",
+    }
+}
 
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
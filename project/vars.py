@@ -1,10 +1,11 @@
 from json import load
 from pathlib import Path
 
+from app.locations import Locations
+
 ROOT = Path(__file__).parent.parent
 
-with open(ROOT / 'static/cities.json') as file:
-    CITIES = load(file)
+LOCATIONS = Locations()
 
 with open(ROOT / 'static/countries.json') as file:
     COUNTRIES = load(file)
@@ -14,9 +14,10 @@ function getPage(event) {
     event.preventDefault();
     var element = event.currentTarget;
     var page = element.dataset.page;
+    var before = element.dataset.before;
     var loader = element.parentElement.parentElement;
     var items = loader.parentElement;
-    var url = window.location.pathname + "?p=" + page;
+    var url = window.location.pathname + (before ? "?before=" + before : "?p=" + page);
     element.innerText = "Loading...";
     ajax(url, "get", "text", function (data) {
         loader.remove();